@@ -0,0 +1,81 @@
+import os
+from fastapi import APIRouter, HTTPException
+from typing import List, Dict, Optional
+from pydantic import BaseModel
+import config
+from jobs.queue import JobQueue
+
+class IndexJobRequest(BaseModel):
+    '''Модель для постановки задания индексации'''
+    videos_dir: str = config.VIDEO_DIR
+    force_reindex: bool = False
+    video_paths: Optional[List[str]] = None
+
+class VideoProgress(BaseModel):
+    '''Модель прогресса по одному видео'''
+    video_path: str
+    status: str
+    error: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
+
+class IndexJob(BaseModel):
+    '''Модель задания индексации'''
+    id: str
+    status: str
+    videos_dir: str
+    force_reindex: bool
+    video_paths: Optional[List[str]] = None
+    cancel_requested: bool
+    worker: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict[str, int]
+    videos: List[VideoProgress]
+
+def _is_within(path: str, directory: str) -> bool:
+    path, directory = os.path.realpath(path), os.path.realpath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+def validate_job_request(request: IndexJobRequest) -> None:
+    '''
+    задание может ссылаться только на разрешенные директории (config.INDEX_ALLOWED_DIRS),
+    а отдельные файлы - только внутри videos_dir или raw-директории рядом с ним
+    '''
+    if not any(_is_within(request.videos_dir, root) for root in config.INDEX_ALLOWED_DIRS):
+        raise HTTPException(status_code=400, detail=f"Директория {request.videos_dir} не разрешена для индексации")
+    raw_videos_dir = os.path.join(os.path.dirname(os.path.abspath(request.videos_dir)), "video_examples_raw")
+    for video_path in request.video_paths or []:
+        if not (_is_within(video_path, request.videos_dir) or _is_within(video_path, raw_videos_dir)):
+            raise HTTPException(status_code=400, detail=f"Файл {video_path} вне {request.videos_dir} и {raw_videos_dir}")
+
+def create_jobs_router(job_queue: JobQueue) -> APIRouter:
+    '''эндпоинты очереди индексации; сама индексация выполняется воркером (main.py --mode worker)'''
+    router = APIRouter(prefix="/index/jobs", tags=["Indexing"])
+
+    @router.post("", response_model=IndexJob, status_code=202)
+    def create_job(request: IndexJobRequest):
+        '''постановка задания индексации в очередь'''
+        validate_job_request(request)
+        job_id = job_queue.enqueue(request.videos_dir, request.force_reindex, request.video_paths)
+        return job_queue.get(job_id)
+
+    @router.get("/{job_id}", response_model=IndexJob)
+    def get_job(job_id: str):
+        '''статус задания с прогрессом и таймингами по каждому видео'''
+        job = job_queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Задание не найдено")
+        return job
+
+    @router.post("/{job_id}/cancel", response_model=IndexJob)
+    def cancel_job(job_id: str):
+        '''отмена задания: из очереди - сразу, выполняющегося - после текущего видео'''
+        if job_queue.get(job_id) is None:
+            raise HTTPException(status_code=404, detail="Задание не найдено")
+        if not job_queue.request_cancel(job_id):
+            raise HTTPException(status_code=409, detail="Задание уже завершено")
+        return job_queue.get(job_id)
+
+    return router
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from monitoring.metrics import CACHE_EVENTS
+
+
+class ResultPageCache:
+    '''
+    кэш слитых выдач поиска для постраничной выдачи: первая страница всегда считается заново
+    (глубиной config.SEARCH_PAGINATION_DEPTH) и сохраняется сюда, следующие страницы по курсору
+    берутся отсюда без моделей и Qdrant; выдача помнит поколение индекса, и после изменений индекса
+    курсор на нее считается устаревшим
+    '''
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        '''
+        параметры:
+            ttl: время жизни выдачи (сек.), по умолчанию config.SEARCH_PAGE_CACHE_TTL
+            max_entries: макс кол-во выдач, самые старые вытесняются (по умолчанию config.SEARCH_PAGE_CACHE_SIZE)
+        '''
+        self.ttl = ttl or config.SEARCH_PAGE_CACHE_TTL
+        self.max_entries = max_entries or config.SEARCH_PAGE_CACHE_SIZE
+        self._entries: "OrderedDict[str, Tuple[float, str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, filters: Optional[Dict[str, Any]], generation: str) -> str:
+        '''ключ выдачи: запрос, фильтры и поколение индекса'''
+        raw = json.dumps([query, filters, generation], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def get(self, key: str, generation: str) -> Optional[List[Dict[str, Any]]]:
+        '''выдача по ключу (None - нет, истек срок или индекс с тех пор изменился)'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                CACHE_EVENTS.labels("pages", "miss").inc()
+                return None
+            expires_at, entry_generation, results = entry
+            if expires_at < time.monotonic() or entry_generation != generation:
+                del self._entries[key]
+                CACHE_EVENTS.labels("pages", "expired").inc()
+                CACHE_EVENTS.labels("pages", "miss").inc()
+                return None
+            CACHE_EVENTS.labels("pages", "hit").inc()
+            return results
+
+    def put(self, key: str, generation: str, results: List[Dict[str, Any]]) -> None:
+        '''сохранение выдачи, посчитанной на поколении индекса generation; при переполнении вытесняются самые старые'''
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, generation, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                CACHE_EVENTS.labels("pages", "eviction").inc()
+
+    @staticmethod
+    def make_cursor(key: str, offset: int) -> str:
+        return f"{key}.{offset}"
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> Tuple[str, int]:
+        '''ключ выдачи и смещение из курсора (ValueError - курсор поврежден)'''
+        key, _, offset = cursor.partition('.')
+        if not key or not offset.isdigit():
+            raise ValueError(f"Некорректный курсор: {cursor}")
+        return key, int(offset)
@@ -1,18 +1,48 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Header, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 from typing import List, Dict, Any, Optional
 import numpy as np
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import config
 from vectordb.qdrant_client import QdrantManager
+from vectordb.backends import create_db_manager
 from embedding.embedder import MultimodalEmbedder
+from models import get_registry
+from jobs.queue import JobQueue
+from api.jobs_api import create_jobs_router
+from api.uploads_api import create_uploads_router
+from api.page_cache import ResultPageCache
+from monitoring import metrics_response
+from monitoring.profiling import start_profile, save_profile, load_profile_summary
+from monitoring.metrics import SEARCH_REQUEST_SECONDS, SEARCH_STAGE_SECONDS, SEARCH_IN_FLIGHT, CACHE_EVENTS, VECTORDB_DEGRADED
+
+# модели, нужные для поиска (whisper - только для индексации)
+SEARCH_MODELS = ("clip", "text_dense", "text_sparse")
+
+class RangeFilter(BaseModel):
+    '''Диапазон значений числового поля (границы включительно)'''
+    gte: Optional[float] = None
+    lte: Optional[float] = None
+
+class SearchFilters(BaseModel):
+    '''Фильтры поиска по метаданным видео'''
+    duration: Optional[RangeFilter] = None  # секунды
+    width: Optional[RangeFilter] = None
+    height: Optional[RangeFilter] = None
+    fps: Optional[RangeFilter] = None
+    language: Optional[List[str]] = None  # коды языков whisper: ["ru", "en"]
+    file_size: Optional[RangeFilter] = None  # байты
+    ingested_at: Optional[RangeFilter] = None  # unix-время индексации
 
 class SearchQuery(BaseModel):
     '''Модель для запроса поиска видео'''
     query: str
-    limit: Optional[int] = config.SEARCH_LIMIT
+    limit: int = Field(config.SEARCH_LIMIT, gt=0, le=config.SEARCH_PAGINATION_DEPTH)  # размер страницы
+    filters: Optional[SearchFilters] = None
+    cursor: Optional[str] = None  # из заголовка X-Next-Cursor предыдущей страницы
 
 class SearchResult(BaseModel):
     '''Модель для результата поиска видео'''
@@ -23,9 +53,22 @@ class SearchResult(BaseModel):
     transcript: Optional[str] = None
     query: str
     preview_path: Optional[str] = None
+    sprite_path: Optional[str] = None
+
+class CachedStaticFiles(StaticFiles):
+    '''статика с долгим кэшированием в браузере: имена превью меняются вместе с содержимым'''
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = f"public, max-age={config.STATIC_CACHE_MAX_AGE}, immutable"
+        return response
 
-def create_app():
-    '''Создание FastAPI приложения для поиска видео'''
+def create_app(embedder: Optional[MultimodalEmbedder] = None, db_manager: Optional[QdrantManager] = None):
+    '''
+    Создание FastAPI приложения для поиска видео
+    параметры:
+        embedder: готовый эмбеддер (по умолчанию создается новый)
+        db_manager: готовый менеджер БД (по умолчанию создается новый)
+    '''
     app = FastAPI(title="Video Search API", description="API для умного поиска видеороликов")
     
     # Настройка CORS
@@ -38,10 +81,22 @@ def create_app():
     )
     
     static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    os.makedirs(static_dir, exist_ok=True)
+    app.mount("/static", CachedStaticFiles(directory=static_dir), name="static")
     
-    embedder = MultimodalEmbedder()
-    db_manager = QdrantManager()
+    models = get_registry()
+    if embedder is None:
+        embedder = MultimodalEmbedder()
+        # модели поиска загружаются сразу, чтобы первый запрос не ждал загрузки; whisper API не нужен
+        for name in SEARCH_MODELS:
+            models.get(name)
+    models.start_idle_eviction()
+    db_manager = db_manager or create_db_manager()
+    page_cache = ResultPageCache()
+    VECTORDB_DEGRADED.set(1 if db_manager.degraded else 0)
+    job_queue = JobQueue()
+    app.include_router(create_jobs_router(job_queue))
+    app.include_router(create_uploads_router(job_queue))
     
     @app.get("/", tags=["Root"])
     async def root():
@@ -49,18 +104,77 @@ def create_app():
         return {"message": "Умный поиск видеороликов API"}
     
     @app.post("/search", response_model=List[SearchResult], tags=["Search"])
-    async def search_videos(search_query: SearchQuery):
+    async def search_videos(search_query: SearchQuery,
+                            response: Response,
+                            profile: bool = Query(False, description="Снять профиль cProfile для этого запроса"),
+                            x_profile: Optional[str] = Header(None)):
         '''
         эндпоинт для поиска видео по текстовому запросу
         параметры:
             search_query: запрос для поиска видео
+            profile / заголовок X-Profile: 1 - профилировать запрос, ID профиля вернется в заголовке X-Profile-Id
+            cursor: курсор следующей страницы (заголовок X-Next-Cursor ответа), запрос и фильтры те же
         вывод: список найденных видео с оценкой
         '''
+        if not (profile or x_profile in ("1", "true")):
+            return run_search(search_query, response)
+
+        profiler = start_profile()
+        try:
+            return run_search(search_query, response)
+        finally:
+            response.headers["X-Profile-Id"] = save_profile(profiler, "search")
+
+    def run_search(search_query: SearchQuery, response: Response):
+        '''
+        страница выдачи: по курсору - из кэша страниц, первая страница - всегда полный поиск
+        (через семантический кэш) с сохранением глубокой выдачи для курсоров
+        '''
+        with SEARCH_IN_FLIGHT.track_inprogress(), SEARCH_REQUEST_SECONDS.time():
+            filters = search_query.filters.dict(exclude_none=True) if search_query.filters else None
+            # ошибка в фильтрах - ошибка клиента, а не пустая выдача
+            try:
+                filters = db_manager.normalize_filters(filters)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                with SEARCH_STAGE_SECONDS.labels("index_generation").time():
+                    generation = db_manager.index_generation()
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Ошибка поиска: {str(e)}")
+            if search_query.cursor:
+                try:
+                    key, offset = page_cache.parse_cursor(search_query.cursor)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                results = page_cache.get(key, generation)
+                if results is None:
+                    raise HTTPException(status_code=410, detail="Курсор устарел, повторите поиск с первой страницы")
+            else:
+                offset = 0
+                key = page_cache.make_key(search_query.query, filters, generation)
+                results = fused_results(search_query, filters)
+                page_cache.put(key, generation, results)
+
+            page_end = offset + search_query.limit
+            if page_end < len(results):
+                response.headers["X-Next-Cursor"] = page_cache.make_cursor(key, page_end)
+            return results[offset:page_end]
+
+    def fused_results(search_query: SearchQuery, filters: Optional[Dict[str, Any]]):
+        '''поиск видео на глубину SEARCH_PAGINATION_DEPTH: семантический кэш, затем гибридный поиск по всем эмбеддингам'''
         cache_mark = config.CACHE_MARK
+        depth = max(search_query.limit, config.SEARCH_PAGINATION_DEPTH)
+        # кэш хранит выдачи без фильтров, поэтому запросы с фильтрами идут мимо него
+        use_semantic_cache = config.SEMANTIC_CACHE_ENABLED and not filters
         try:
             # dense-эмбеддинги
-            text_dense_vector = embedder.create_text_embeddings(search_query.query)
-            semantic_result = db_manager.semantic_search(text_dense_vector)
+            with SEARCH_STAGE_SECONDS.labels("dense_encode").time():
+                text_dense_vector = embedder.create_text_embeddings(search_query.query)
+            semantic_result = []
+            if use_semantic_cache:
+                with SEARCH_STAGE_SECONDS.labels("semantic_cache_lookup").time():
+                    semantic_result = db_manager.semantic_search(text_dense_vector)
 
         # проверка на наличие запроса в семантической кэше
             if len(semantic_result)==0:
@@ -73,29 +187,58 @@ def create_app():
                     cache_mark = False
                 else:
                     cache_mark = True
+            if use_semantic_cache:
+                CACHE_EVENTS.labels("semantic", "miss" if cache_mark else "hit").inc()
 
             if cache_mark:
                 # мультимодальных эмбеддинги CLIP
-                clip_text_embedding = embedder.create_clip_text_embedding(search_query.query)
+                with SEARCH_STAGE_SECONDS.labels("clip_encode").time():
+                    clip_text_embedding = embedder.create_clip_text_embedding(search_query.query)
                 # sparse-эмбеддинги
-                text_sparse_vector = embedder.create_text_sparse_embeddings(search_query.query)
+                with SEARCH_STAGE_SECONDS.labels("sparse_encode").time():
+                    text_sparse_vector = embedder.create_text_sparse_embeddings(search_query.query)
 
-                results = db_manager.hybrid_search_dbsf(
-                    query_text=search_query.query,
-                    visual_vector=clip_text_embedding,
-                    text_dense_vector=text_dense_vector,
-                    text_sparse_vector=text_sparse_vector[0],
-                    limit=search_query.limit
-                )
-                db_manager.upsert_semantic_cache(search_query.query, text_dense_vector.tolist(), results)
+                with SEARCH_STAGE_SECONDS.labels("hybrid_search").time():
+                    results = db_manager.hybrid_search_dbsf(
+                        query_text=search_query.query,
+                        visual_vector=clip_text_embedding,
+                        text_dense_vector=text_dense_vector,
+                        text_sparse_vector=text_sparse_vector[0],
+                        limit=depth,
+                        filters=filters
+                    )
+                if use_semantic_cache:
+                    with SEARCH_STAGE_SECONDS.labels("semantic_cache_upsert").time():
+                        db_manager.upsert_semantic_cache(search_query.query, text_dense_vector.tolist(), results)
 
             return results
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка поиска: {str(e)}")
     
+    @app.get("/profiles/{profile_id}", response_class=PlainTextResponse, tags=["Health"])
+    async def get_profile(profile_id: str):
+        '''текстовая сводка профиля запроса (полный .prof лежит в logs/profiles)'''
+        summary = load_profile_summary(profile_id)
+        if summary is None:
+            raise HTTPException(status_code=404, detail="Профиль не найден")
+        return summary
+    
+    @app.get("/models", tags=["Health"])
+    def models_report():
+        '''модели процесса API: загружены ли, сколько памяти занимают, сколько простаивают'''
+        return models.report()
+    
+    @app.get("/metrics", tags=["Health"])
+    def metrics():
+        '''метрики в формате Prometheus'''
+        return metrics_response()
+    
     @app.get("/health", tags=["Health"])
     async def health_check():
-        '''Эндпоинт для проверки здоровья сервиса'''
-        return {"status": "healthy"}
+        '''Эндпоинт для проверки здоровья сервиса, в резервном режиме векторной БД - status "degraded"'''
+        return {
+            "status": "degraded" if db_manager.degraded else "healthy",
+            "vector_db": db_manager.status()
+        }
     
     return app 
\ No newline at end of file
@@ -0,0 +1,202 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from pydantic import BaseModel
+import config
+from jobs.queue import JobQueue
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+CHUNK_SIZE = 1024 * 1024
+
+class UploadRequest(BaseModel):
+    '''Модель для создания загрузки'''
+    filename: str
+    size: int
+    sha256: Optional[str] = None
+
+class UploadSession(BaseModel):
+    '''Модель состояния загрузки'''
+    id: str
+    filename: str
+    size: int
+    received: int
+    sha256: Optional[str] = None
+    status: str
+    job_id: Optional[str] = None
+    created_at: float
+
+def create_uploads_router(job_queue: JobQueue) -> APIRouter:
+    '''
+    эндпоинты потоковой загрузки видео: тело запроса пишется на диск частями (память не зависит
+    от размера файла), загрузку можно продолжить с последнего принятого байта, после проверки
+    контрольной суммы файл перемещается в raw-директорию и ставится в очередь индексации
+    '''
+    router = APIRouter(prefix="/uploads", tags=["Upload"])
+    # временные файлы лежат внутри raw-директории, чтобы перемещение было атомарным переименованием
+    uploads_dir = os.path.join(config.RAW_VIDEO_DIR, ".uploads")
+    os.makedirs(uploads_dir, exist_ok=True)
+
+    def part_path(upload_id: str) -> str:
+        return os.path.join(uploads_dir, f"{upload_id}.part")
+
+    def meta_path(upload_id: str) -> str:
+        return os.path.join(uploads_dir, f"{upload_id}.json")
+
+    def lock_path(upload_id: str) -> str:
+        return os.path.join(uploads_dir, f"{upload_id}.lock")
+
+    def check_id(upload_id: str) -> None:
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            raise HTTPException(status_code=404, detail="Загрузка не найдена")
+
+    def load_session(upload_id: str) -> dict:
+        check_id(upload_id)
+        if not os.path.exists(meta_path(upload_id)):
+            raise HTTPException(status_code=404, detail="Загрузка не найдена")
+        with open(meta_path(upload_id), encoding='utf-8') as f:
+            session = json.load(f)
+        part = part_path(upload_id)
+        session['received'] = os.path.getsize(part) if os.path.exists(part) else session['size']
+        return session
+
+    @contextmanager
+    def exclusive(upload_id: str):
+        '''
+        один запрос на загрузку за раз (в том числе из разных процессов API): иначе два PUT с одним
+        смещением оба пройдут проверку и перемешают данные, а complete проверит недописанный файл
+        '''
+        check_id(upload_id)
+        lock_file = open(lock_path(upload_id), 'a')
+        try:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise HTTPException(status_code=409, detail="Загрузка уже обрабатывается другим запросом")
+            yield
+        finally:
+            lock_file.close()
+
+    def target_taken(name: str) -> bool:
+        '''имя занято: в raw-директории есть файл с тем же именем без расширения или уже есть итоговое видео'''
+        if os.path.exists(os.path.join(config.VIDEO_DIR, f"{name}.mp4")):
+            return True
+        return any(os.path.splitext(file)[0] == name for file in os.listdir(config.RAW_VIDEO_DIR))
+
+    def save_session(session: dict) -> None:
+        temp_path = meta_path(session['id']) + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({k: v for k, v in session.items() if k != 'received'}, f, ensure_ascii=False)
+        os.replace(temp_path, meta_path(session['id']))
+
+    @router.post("", response_model=UploadSession, status_code=201)
+    def create_upload(request: UploadRequest):
+        '''создание загрузки: имя файла, ожидаемый размер и (необязательно) SHA-256'''
+        base_name = os.path.basename(request.filename)
+        name, ext = os.path.splitext(base_name)
+        if ext.lower() not in VIDEO_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Неподдерживаемый формат файла: {ext}")
+        if request.size <= 0:
+            raise HTTPException(status_code=400, detail="Размер файла должен быть больше нуля")
+
+        session = {
+            "id": uuid.uuid4().hex,
+            "filename": re.sub(r'[^\w\-_.]', '_', name) + ext.lower(),
+            "size": request.size,
+            "sha256": request.sha256.lower() if request.sha256 else None,
+            "status": "uploading",
+            "job_id": None,
+            "created_at": time.time(),
+        }
+        open(part_path(session['id']), 'wb').close()
+        save_session(session)
+        return load_session(session['id'])
+
+    @router.get("/{upload_id}", response_model=UploadSession)
+    def get_upload(upload_id: str):
+        '''состояние загрузки; received - с какого байта продолжать после обрыва'''
+        return load_session(upload_id)
+
+    @router.put("/{upload_id}", response_model=UploadSession)
+    async def upload_chunk(upload_id: str, request: Request,
+                           offset: int = Query(..., description="Смещение первого байта тела в файле")):
+        '''
+        прием очередной части файла; тело читается потоком, а запись на диск идет в пуле потоков
+        блоками по CHUNK_SIZE, чтобы большие файлы не останавливали цикл событий для остальных запросов
+        '''
+        with exclusive(upload_id):
+            session = load_session(upload_id)
+            if session['status'] != "uploading":
+                raise HTTPException(status_code=409, detail="Загрузка уже завершена")
+            if offset != session['received']:
+                raise HTTPException(status_code=409, detail=f"Ожидается смещение {session['received']}")
+
+            received = offset
+            buffer = bytearray()
+            f = await run_in_threadpool(open, part_path(upload_id), 'ab')
+            try:
+                async for chunk in request.stream():
+                    received += len(chunk)
+                    if received > session['size']:
+                        await run_in_threadpool(f.truncate, offset)
+                        raise HTTPException(status_code=413, detail="Получено больше данных, чем заявлено")
+                    buffer += chunk
+                    if len(buffer) >= CHUNK_SIZE:
+                        await run_in_threadpool(f.write, bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await run_in_threadpool(f.write, bytes(buffer))
+            finally:
+                await run_in_threadpool(f.close)
+            return load_session(upload_id)
+
+    @router.post("/{upload_id}/complete", response_model=UploadSession)
+    def complete_upload(upload_id: str):
+        '''проверка размера и контрольной суммы, перенос в raw-директорию и постановка в очередь индексации'''
+        with exclusive(upload_id):
+            session = load_session(upload_id)
+            if session['status'] != "uploading":
+                return session
+            if session['received'] != session['size']:
+                raise HTTPException(status_code=409, detail=f"Получено {session['received']} из {session['size']} байт")
+
+            part = part_path(upload_id)
+            if session['sha256']:
+                digest = hashlib.sha256()
+                with open(part, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                if digest.hexdigest() != session['sha256']:
+                    os.remove(part)
+                    open(part, 'wb').close()
+                    raise HTTPException(status_code=422, detail="Контрольная сумма не совпадает, загрузите файл заново")
+
+            # при совпадении имени индексация пропустила бы файл (видео с таким именем уже есть)
+            name, ext = os.path.splitext(session['filename'])
+            if target_taken(name):
+                name = f"{name}_{upload_id[:8]}"
+            target_path = os.path.join(config.RAW_VIDEO_DIR, f"{name}{ext}")
+            os.replace(part, target_path)
+
+            session['status'] = "completed"
+            session['job_id'] = job_queue.enqueue(config.VIDEO_DIR, video_paths=[target_path])
+            save_session(session)
+            return load_session(upload_id)
+
+    @router.delete("/{upload_id}", status_code=204)
+    def abort_upload(upload_id: str):
+        '''отмена загрузки и удаление принятых данных'''
+        with exclusive(upload_id):
+            load_session(upload_id)
+            for path in (part_path(upload_id), meta_path(upload_id), lock_path(upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    return router
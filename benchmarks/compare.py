@@ -0,0 +1,49 @@
+'''
+сравнение двух JSON-отчетов benchmarks.run (например, до и после изменения)
+
+пример:
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+'''
+import argparse
+import json
+from typing import Any, Dict
+
+
+def flatten(data: Any, prefix: str = "") -> Dict[str, float]:
+    '''числовые поля отчета в виде {"путь.к.полю": значение}'''
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            flat.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, list):
+        for item in data:
+            # прогоны поиска различаются уровнем параллельности
+            key = f"c{item['concurrency']}" if isinstance(item, dict) and 'concurrency' in item else str(data.index(item))
+            flat.update(flatten(item, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        flat[prefix.rstrip('.')] = float(data)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение результатов бенчмарков')
+    parser.add_argument('baseline', type=str, help='Отчет до изменения')
+    parser.add_argument('candidate', type=str, help='Отчет после изменения')
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline['meta']['commit']}")
+    print(f"candidate: {candidate['meta']['commit']}")
+
+    old, new = flatten(baseline['results']), flatten(candidate['results'])
+    for key in sorted(old.keys() & new.keys()):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:<70} {old[key]:>12.3f} {new[key]:>12.3f} {change:>+8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+'''
+сверка встроенного индекса NumPy с Qdrant на синтетическом каталоге: совпадение top-k
+гибридного поиска и задержки обоих бэкендов (модели не нужны); если среднее совпадение top-k
+ниже --min-overlap, скрипт завершается с кодом 1 (для проверки регрессий)
+
+пример:
+    python -m benchmarks.parity --videos 20000 --queries 200
+    python -m benchmarks.parity --qdrant-url http://localhost:6333   # сравнение с сервером Qdrant
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import config
+from qdrant_client import QdrantClient
+from vectordb.qdrant_client import QdrantManager
+from vectordb.numpy_index import NumpyIndexManager
+
+
+def setup_parser():
+    parser = argparse.ArgumentParser(description='Сверка индекса NumPy с Qdrant')
+    parser.add_argument('--videos', type=int, default=5000, help='Размер синтетического каталога')
+    parser.add_argument('--queries', type=int, default=100, help='Количество запросов')
+    parser.add_argument('--limit', type=int, default=config.SEARCH_LIMIT, help='Размер выдачи')
+    parser.add_argument('--vocabulary', type=int, default=20000, help='Размер словаря sparse-векторов')
+    parser.add_argument('--qdrant-url', type=str, default=None,
+                        help='Сервер Qdrant для сравнения (по умолчанию Qdrant в памяти)')
+    parser.add_argument('--min-overlap', type=float, default=0.99,
+                        help='Минимальное среднее совпадение top-k, ниже - код выхода 1')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=str, default=None, help='Файл для сохранения результатов в JSON')
+    return parser
+
+
+def random_sparse(rng, vocabulary: int, terms: int):
+    '''sparse-вектор с частотами терминов по закону Ципфа, как у реальных текстов'''
+    indices = np.unique(np.minimum(rng.zipf(1.3, size=terms), vocabulary) - 1).astype(np.int64)
+    values = rng.uniform(0.1, 2.0, size=len(indices)).astype(np.float32)
+    return SimpleNamespace(indices=indices, values=values)
+
+
+def random_dense(rng, dim: int):
+    vector = rng.normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def main():
+    args = setup_parser().parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    # отдельная коллекция, чтобы не задеть боевые данные на сервере
+    config.QDRANT_COLLECTION = "video_search_parity"
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:")
+    qdrant = QdrantManager(client=client)
+    numpy_index = NumpyIndexManager(index_dir=tempfile.mkdtemp(prefix="numpy_index_parity_"))
+
+    print(f"Заполнение каталога: {args.videos} видео")
+    for i in range(args.videos):
+        point = {
+            "video_path": f"video_examples/synthetic_{i}.mp4",
+            "visual_embeds": random_dense(rng, config.VISUAL_VECTOR_SIZE),
+            "text_dense_embeds": random_dense(rng, config.TEXT_VECTOR_SIZE),
+            "text_sparse_embeds": random_sparse(rng, args.vocabulary, 80),
+        }
+        for manager in (qdrant, numpy_index):
+            manager.index_video(metadata={"transcript": "", "frames_count": 0, "preview_path": '-'}, **point)
+
+    overlaps, exact, latencies = [], 0, {"qdrant": [], "numpy": []}
+    for _ in range(args.queries):
+        query = {
+            "query_text": "",
+            "visual_vector": random_dense(rng, config.VISUAL_VECTOR_SIZE),
+            "text_dense_vector": random_dense(rng, config.TEXT_VECTOR_SIZE),
+            "text_sparse_vector": random_sparse(rng, args.vocabulary, 5),
+            "limit": args.limit,
+        }
+        found = {}
+        for name, manager in (("qdrant", qdrant), ("numpy", numpy_index)):
+            started = time.perf_counter()
+            results = manager.hybrid_search_dbsf(**query)
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            found[name] = [result['video_path'] for result in results]
+
+        overlaps.append(len(set(found["qdrant"]) & set(found["numpy"])) / max(1, len(found["qdrant"])))
+        exact += found["qdrant"] == found["numpy"]
+
+    mean_overlap = float(np.mean(overlaps))
+    report = {
+        "videos": args.videos,
+        "queries": args.queries,
+        "limit": args.limit,
+        "qdrant": args.qdrant_url or ":memory:",
+        f"mean_overlap_at_{args.limit}": mean_overlap,
+        "exact_order_match_ratio": exact / args.queries,
+        "min_overlap": args.min_overlap,
+        "passed": mean_overlap >= args.min_overlap,
+        "latency_ms": {
+            name: {
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "p99": float(np.percentile(values, 99)),
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+    if args.qdrant_url:
+        client.delete_collection(qdrant._alias_target())
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+    if not report["passed"]:
+        print(f"Совпадение top-{args.limit} {mean_overlap:.4f} ниже порога {args.min_overlap}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
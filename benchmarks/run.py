@@ -0,0 +1,343 @@
+'''
+воспроизводимый бенчмарк индексации и поиска на видео из video_examples
+
+работает офлайн: Qdrant в памяти (или локальная папка --qdrant-path), API поднимается
+в этом же процессе; с --tiny-models вместо боевых моделей берутся маленькие заглушки
+
+пример:
+    python -m benchmarks.run --tiny-models --max-videos 5 --output benchmarks/results/$(git rev-parse --short HEAD).json
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# маленькие модели для быстрых прогонов (размерности векторов определяются после загрузки)
+TINY_MODELS = {
+    "TRANSCRIBE_MODEL": "tiny",
+    "VISUAL_MODEL": "hf-internal-testing/tiny-random-CLIPModel",
+    "TEXT_MODEL": "sentence-transformers/all-MiniLM-L6-v2",
+}
+
+DEFAULT_QUERIES = [
+    "кошка играет с мячом",
+    "человек едет на велосипеде",
+    "рецепт приготовления пасты",
+    "закат над морем",
+    "футбольный матч",
+    "как настроить роутер",
+    "собака бежит по пляжу",
+    "новости экономики",
+]
+
+
+def setup_parser():
+    parser = argparse.ArgumentParser(description='Бенчмарк индексации и поиска видео')
+    parser.add_argument('--videos_dir', type=str, default=os.path.join(BASE_DIR, 'video_examples'),
+                        help='Директория с видео для бенчмарка')
+    parser.add_argument('--max-videos', type=int, default=0,
+                        help='Ограничение количества видео (0 - все)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Файл для сохранения результатов в JSON (по умолчанию - вывод в stdout)')
+    parser.add_argument('--qdrant-path', type=str, default=None,
+                        help='Локальная папка для Qdrant (по умолчанию Qdrant в памяти)')
+    parser.add_argument('--tiny-models', action='store_true',
+                        help='Использовать маленькие модели-заглушки вместо боевых')
+    parser.add_argument('--upsert-points', type=int, default=1000,
+                        help='Количество точек для замера скорости записи в Qdrant')
+    parser.add_argument('--search-requests', type=int, default=200,
+                        help='Количество запросов /search на каждый прогон')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help='Уровни параллельности запросов /search')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='Порт, на котором поднимается API для замеров')
+    return parser
+
+
+def timed(func, *args, **kwargs):
+    '''вызов функции с замером времени: (результат, секунды)'''
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def bench_decode(processor, video_paths: List[str]) -> Dict[str, Any]:
+    '''скорость извлечения кадров: extract_frames (OpenCV) и decode_video (ffmpeg, кадры + аудио)'''
+    results = {}
+    for name in ("extract_frames", "decode_video"):
+        frames_total, seconds_total, media_seconds = 0, 0.0, 0.0
+        for video_path in video_paths:
+            if name == "extract_frames":
+                frames, elapsed = timed(processor.extract_frames, video_path)
+            else:
+                (frames, audio_path), elapsed = timed(processor.decode_video, video_path)
+                processor.cleanup_temp_file(audio_path)
+            frames_total += len(frames)
+            seconds_total += elapsed
+            media_seconds += processor.probe_video(video_path)['duration']
+        results[name] = {
+            "videos": len(video_paths),
+            "frames": frames_total,
+            "seconds": seconds_total,
+            "frames_per_sec": frames_total / seconds_total if seconds_total else 0.0,
+            "video_seconds_per_sec": media_seconds / seconds_total if seconds_total else 0.0,
+        }
+    return results
+
+
+def bench_transcribe(processor, video_paths: List[str]) -> Dict[str, Any]:
+    '''realtime factor транскрипции: время обработки / длительность аудио (меньше - лучше)'''
+    transcripts, audio_seconds, seconds_total = {}, 0.0, 0.0
+    for video_path in video_paths:
+        _, audio_path = processor.decode_video(video_path)
+        try:
+            audio_seconds += processor.get_audio_duration(audio_path)
+            transcripts[video_path], elapsed = timed(processor.transcribe_audio, audio_path)
+            seconds_total += elapsed
+        finally:
+            processor.cleanup_temp_file(audio_path)
+    return {
+        "videos": len(video_paths),
+        "audio_seconds": audio_seconds,
+        "seconds": seconds_total,
+        "realtime_factor": seconds_total / audio_seconds if audio_seconds else 0.0,
+    }, transcripts
+
+
+def bench_embedder(embedder, frames_by_video: Dict[str, list], transcripts: Dict[str, str]) -> Dict[str, Any]:
+    '''эмбеддинги в секунду для каждого метода MultimodalEmbedder'''
+    results = {}
+
+    frames_total, seconds_total = 0, 0.0
+    for frames in frames_by_video.values():
+        _, elapsed = timed(embedder.create_visual_embeddings, frames)
+        frames_total += len(frames)
+        seconds_total += elapsed
+    results["create_visual_embeddings"] = {
+        "inputs": frames_total,
+        "seconds": seconds_total,
+        "embeddings_per_sec": frames_total / seconds_total if seconds_total else 0.0,
+    }
+
+    texts = {
+        "create_text_embeddings": list(transcripts.values()),
+        "create_text_sparse_embeddings": list(transcripts.values()),
+        "create_clip_text_embedding": DEFAULT_QUERIES,
+    }
+    for method_name, inputs in texts.items():
+        method = getattr(embedder, method_name)
+        seconds_total = 0.0
+        for text in inputs:
+            _, elapsed = timed(method, text)
+            seconds_total += elapsed
+        results[method_name] = {
+            "inputs": len(inputs),
+            "seconds": seconds_total,
+            "embeddings_per_sec": len(inputs) / seconds_total if seconds_total else 0.0,
+        }
+    return results
+
+
+def build_points(embedder, frames_by_video: Dict[str, list], transcripts: Dict[str, str]) -> List[Dict[str, Any]]:
+    '''эмбеддинги видео для записи в Qdrant'''
+    points = []
+    for video_path, frames in frames_by_video.items():
+        transcript = transcripts.get(video_path, "")
+        points.append({
+            "video_path": video_path,
+            "visual_embeds": embedder.create_visual_embeddings(frames),
+            "text_dense_embeds": embedder.create_text_embeddings(transcript),
+            "text_sparse_embeds": embedder.create_text_sparse_embeddings(transcript)[0],
+            "metadata": {"transcript": transcript, "frames_count": len(frames), "preview_path": '-'},
+        })
+    return points
+
+
+def bench_upsert(db_manager, points: List[Dict[str, Any]], total_points: int) -> Dict[str, Any]:
+    '''скорость записи точек в Qdrant (реальные эмбеддинги повторяются по кругу)'''
+    started = time.perf_counter()
+    for i in range(total_points):
+        point = points[i % len(points)]
+        db_manager.index_video(
+            video_path=point["video_path"],
+            visual_embeds=point["visual_embeds"],
+            text_dense_embeds=point["text_dense_embeds"],
+            text_sparse_embeds=point["text_sparse_embeds"],
+            metadata=dict(point["metadata"])
+        )
+    elapsed = time.perf_counter() - started
+    return {
+        "points": total_points,
+        "seconds": elapsed,
+        "points_per_sec": total_points / elapsed if elapsed else 0.0,
+    }
+
+
+def start_api(app, port: int):
+    '''запуск API в фоновом потоке этого же процесса'''
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def bench_search(port: int, queries: List[str], total_requests: int, concurrency: int) -> Dict[str, Any]:
+    '''задержки /search при заданной параллельности: p50/p95/p99 и пропускная способность'''
+    import numpy as np
+    import requests
+
+    session_local = threading.local()
+
+    def send(i):
+        session = getattr(session_local, "session", None)
+        if session is None:
+            session = session_local.session = requests.Session()
+        started = time.perf_counter()
+        response = session.post(f"http://127.0.0.1:{port}/search", json={"query": queries[i % len(queries)]})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(send, range(total_requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "requests_per_sec": total_requests / elapsed if elapsed else 0.0,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    args = setup_parser().parse_args()
+
+    # переопределение моделей должно произойти до импорта config
+    if args.tiny_models:
+        for key, value in TINY_MODELS.items():
+            os.environ.setdefault(key, value)
+
+    import config
+    import torch
+    from qdrant_client import QdrantClient
+    from video_processor.processor import VideoProcessor
+    from embedding.embedder import MultimodalEmbedder
+    from models import get_registry
+    from vectordb.qdrant_client import QdrantManager
+    from api.search_api import create_app
+
+    processor = VideoProcessor()
+    video_paths = sorted(processor.get_video_files(args.videos_dir))
+    if args.max_videos:
+        video_paths = video_paths[:args.max_videos]
+    if not video_paths:
+        raise SystemExit(f"В {args.videos_dir} нет видео для бенчмарка")
+
+    embedder = MultimodalEmbedder()
+    # модели загружаются лениво; грузим заранее, чтобы загрузка не попала в замеры этапов
+    for name in ("whisper", "clip", "text_dense", "text_sparse"):
+        get_registry().get(name)
+    # размерности берем у загруженных моделей, чтобы коллекции совпали с заглушками
+    config.VISUAL_VECTOR_SIZE = len(embedder.create_clip_text_embedding("test"))
+    config.TEXT_VECTOR_SIZE = len(embedder.create_text_embeddings("test"))
+
+    results: Dict[str, Any] = {}
+    print(f"Видео для бенчмарка: {len(video_paths)}")
+
+    print("Извлечение кадров...")
+    results["decode"] = bench_decode(processor, video_paths)
+    frames_by_video = {video_path: processor.decode_video(video_path) for video_path in video_paths}
+    for video_path, (frames, audio_path) in frames_by_video.items():
+        processor.cleanup_temp_file(audio_path)
+        frames_by_video[video_path] = frames
+
+    print("Транскрипция...")
+    results["transcribe"], transcripts = bench_transcribe(processor, video_paths)
+
+    print("Эмбеддинги...")
+    results["embed"] = bench_embedder(embedder, frames_by_video, transcripts)
+    points = build_points(embedder, frames_by_video, transcripts)
+
+    client = QdrantClient(path=args.qdrant_path) if args.qdrant_path else QdrantClient(":memory:")
+    db_manager = QdrantManager(client=client)
+
+    print("Запись в Qdrant...")
+    results["upsert"] = bench_upsert(db_manager, points, args.upsert_points)
+
+    print("Поиск...")
+    queries = DEFAULT_QUERIES + [t[:200] for t in transcripts.values() if t]
+    server, thread = start_api(create_app(embedder=embedder, db_manager=db_manager), args.port)
+    try:
+        results["search"] = {}
+        # запросы без курсора: первые страницы всегда считаются заново, кэш страниц замер не искажает
+        for cache_enabled in (False, True):
+            config.SEMANTIC_CACHE_ENABLED = cache_enabled
+            label = "semantic_cache_on" if cache_enabled else "semantic_cache_off"
+            if cache_enabled:
+                # прогрев: заполняем кэш всеми запросами
+                bench_search(args.port, queries, len(queries), 1)
+            results["search"][label] = [
+                bench_search(args.port, queries, args.search_requests, concurrency)
+                for concurrency in args.concurrency
+            ]
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "device": "cuda" if torch.cuda.is_available() else "cpu",
+            "cpu_count": os.cpu_count(),
+            "models": {
+                "transcribe": config.TRANSCRIBE_MODEL,
+                "visual": config.VISUAL_MODEL,
+                "text": config.TEXT_MODEL,
+                "text_sparse": config.TEXT_SPARSE_MODEL,
+            },
+            "qdrant": args.qdrant_path or ":memory:",
+            "frame_selection_mode": config.FRAME_SELECTION_MODE,
+            "videos": len(video_paths),
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"Результаты сохранены в {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
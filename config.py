@@ -4,32 +4,114 @@ from pathlib import Path
 # Базовые пути
 BASE_DIR = Path(__file__).parent
 VIDEO_DIR = os.path.join(BASE_DIR, "video_examples")
+RAW_VIDEO_DIR = os.path.join(BASE_DIR, "video_examples_raw")
 TEMP_DIR = os.path.join(BASE_DIR, "temp")
 
 # Параметры обработки видео
 FRAME_EXTRACTION_INTERVAL = 1  # Интервал извлечения кадров в секундах
 MAX_FRAMES_PER_VIDEO = 30  # Максимальное количество кадров для анализа с одного видео
+AUDIO_SAMPLE_RATE = 16000  # Частота дискретизации аудио для транскрипции
+
+# Отбор кадров: "interval" - каждые FRAME_EXTRACTION_INTERVAL секунд (первые MAX_FRAMES_PER_VIDEO),
+# "scene" - на сменах сцен (MAX_FRAMES_PER_VIDEO из них равномерно по всему видео)
+FRAME_SELECTION_MODE = os.getenv("FRAME_SELECTION_MODE", "interval")
+SCENE_SAMPLE_FPS = 4  # Частота просмотра кадров при поиске смен сцен
+SCENE_DOWNSCALE_SIZE = (64, 36)  # Размер уменьшенного кадра для сравнения (ширина, высота)
+SCENE_FRAME_WIDTH = 640  # Ширина кадров смен сцен, которые сохраняются для CLIP и превью
+SCENE_HIST_THRESHOLD = 0.35  # Порог расстояния Бхаттачарьи между HSV-гистограммами соседних кадров
+SCENE_PIXEL_THRESHOLD = 0.12  # Порог средней попиксельной разницы соседних кадров (доля от 255)
+SCENE_MAX_GAP = 10  # Максимальный промежуток без кадров в статичной сцене, секунд
+FRAME_DEDUP_DISTANCE = 4  # Кадр с dHash ближе этого расстояния к предыдущему взятому отбрасывается
+
+# Параметры конвертации видео (ffmpeg)
+FFMPEG_PRESET = os.getenv("FFMPEG_PRESET", "veryfast")  # Пресет libx264: быстрее - больше файл
+FFMPEG_CRF = int(os.getenv("FFMPEG_CRF", 23))  # Качество libx264: меньше - лучше качество и больше файл
+# Одновременных процессов ffmpeg при индексации: декодирование и конвертация идут на столько видео вперед
+# транскрипции (кадры этих видео держатся в памяти), 0 - по числу ядер
+CONVERT_WORKERS = int(os.getenv("CONVERT_WORKERS", 2))
+
+# Превью и спрайты из уже декодированных кадров (static/previews, отдаются API с долгим кэшированием)
+PREVIEWS_DIR = os.path.join(BASE_DIR, "static", "previews")
+PREVIEW_FORMAT = os.getenv("PREVIEW_FORMAT", "webp")  # "webp" или "jpeg"
+PREVIEW_WIDTH = 320  # Ширина превью в пикселях
+PREVIEW_QUALITY = 80
+SPRITE_TILE_WIDTH = 160  # Ширина одного кадра в спрайте
+SPRITE_COLUMNS = 4
+SPRITE_MAX_FRAMES = 16
+STATIC_CACHE_MAX_AGE = 31536000  # Cache-Control для /static (сек.): имена превью меняются вместе с содержимым
+
+# Поиск дубликатов при индексации
+DUPLICATE_DETECTION = True  # Проверять видео на дубликаты до транскрипции
+DUPLICATE_DURATION_TOLERANCE = 1.0  # Допустимая разница длительности аудио в секундах
+DUPLICATE_HASH_DISTANCE = 10  # Максимальное расстояние Хэмминга между хэшами похожих кадров (из 64 бит)
+DUPLICATE_MATCH_RATIO = 0.8  # Доля похожих кадров, начиная с которой видео считается дубликатом
+DUPLICATE_MIN_DISTINCT_FRAMES = 4  # Меньше различимых кадров (статичная картинка, слайды) - отпечаток не сравнивается
 
 # Параметры моделей
-TRANSCRIBE_MODEL = "base"
-VISUAL_MODEL = "laion/CLIP-ViT-B-32-laion2B-s34B-b79K"
-TEXT_MODEL = "mixedbread-ai/mxbai-embed-large-v1"
-TEXT_SPARSE_MODEL = "Qdrant/bm25"
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "base")
+VISUAL_MODEL = os.getenv("VISUAL_MODEL", "laion/CLIP-ViT-B-32-laion2B-s34B-b79K")
+TEXT_MODEL = os.getenv("TEXT_MODEL", "mixedbread-ai/mxbai-embed-large-v1")
+TEXT_SPARSE_MODEL = os.getenv("TEXT_SPARSE_MODEL", "Qdrant/bm25")
+
+MODEL_IDLE_TIMEOUT = int(os.getenv("MODEL_IDLE_TIMEOUT", 0))  # Выгружать модели после простоя (сек.), 0 - не выгружать
+
+# Векторная БД: "qdrant" - сервер Qdrant, "numpy" - встроенный индекс в файлах (для небольших каталогов и демо)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", os.path.join(BASE_DIR, "numpy_index"))
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32")  # float16 - вдвое меньше места, чуть медленнее поиск
+RRF_K = 2  # Константа в слиянии RRF: 1 / (позиция + RRF_K), как в Qdrant
 
 # Параметры Qdrant
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
-QDRANT_COLLECTION = "video_search"
-VISUAL_VECTOR_SIZE = 512
+# Режим: "remote" - сервер по QDRANT_HOST, "local" - встроенный Qdrant в папке QDRANT_PATH (один процесс на папку),
+# "memory" - в памяти, данные теряются при перезапуске
+QDRANT_MODE = os.getenv("QDRANT_MODE", "remote")
+QDRANT_PATH = os.getenv("QDRANT_PATH", os.path.join(BASE_DIR, "qdrant_local"))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "true").lower() == "true"
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", 10))  # Таймаут запросов к серверу (сек.)
+QDRANT_PROBE_TIMEOUT = float(os.getenv("QDRANT_PROBE_TIMEOUT", 0.5))  # Таймаут одной проверки доступности (сек.)
+QDRANT_CONNECT_ATTEMPTS = int(os.getenv("QDRANT_CONNECT_ATTEMPTS", 5))  # Проверки при старте: паузы 0.1, 0.2, 0.4, 0.8 сек.
+QDRANT_BACKOFF_BASE = 0.1
+QDRANT_BACKOFF_MAX = 2.0
+# Что делать, если сервер недоступен: "local" - встроенный Qdrant в QDRANT_PATH, "memory" - в памяти, "none" - ошибка
+QDRANT_FALLBACK = os.getenv("QDRANT_FALLBACK", "local")
+QDRANT_COLLECTION = "video_search"  # Алиас, за которым стоит текущая версия коллекции (video_search_v<дата>)
+SNAPSHOTS_DIR = os.getenv("SNAPSHOTS_DIR", os.path.join(BASE_DIR, "snapshots"))  # Архивы --mode snapshot-export
+QDRANT_HNSW_M = 16  # Параметры HNSW, включаемые после массовой загрузки при пересборке
+QDRANT_INDEXING_THRESHOLD = 20000
+QDRANT_OPTIMIZE_TIMEOUT = int(os.getenv("QDRANT_OPTIMIZE_TIMEOUT", 1800))  # Ожидание построения индекса при пересборке (сек.)
+REBUILD_MAX_FAILED = int(os.getenv("REBUILD_MAX_FAILED", 0))  # Сколько видео может упасть, чтобы пересборка все равно применилась
+VISUAL_VECTOR_SIZE = int(os.getenv("VISUAL_VECTOR_SIZE", 512))
 AUDIO_VECTOR_SIZE = 512
-TEXT_VECTOR_SIZE = 1024
+TEXT_VECTOR_SIZE = int(os.getenv("TEXT_VECTOR_SIZE", 1024))
 
 # Параметры API
 API_HOST = "0.0.0.0"
 API_PORT = 8000
 SEARCH_LIMIT = 10
 CACHE_MARK = False
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
 THRESHOLD_SEMANTIC = 0.9
+SEARCH_PAGINATION_DEPTH = 50  # Глубина выдачи, которая считается на первой странице и листается курсором
+SEARCH_PAGE_CACHE_TTL = 120  # Время жизни выдачи для курсоров (сек.)
+SEARCH_PAGE_CACHE_SIZE = 512  # Макс кол-во выдач в кэше страниц
+SEARCH_GENERATION_TTL = 5  # Как часто API перечитывает из Qdrant версию и размер индекса для курсоров (сек.)
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://localhost:8000")  # Адрес API, доступный из браузера (для превью)
+
+# Очередь заданий индексации
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(BASE_DIR, "jobs_data", "jobs.db"))
+JOBS_POLL_INTERVAL = 1.0  # Пауза между опросами пустой очереди воркером, секунд
+JOBS_HEARTBEAT_INTERVAL = 10.0  # Как часто воркер продлевает аренду своих заданий, секунд
+JOBS_LEASE_TIMEOUT = float(os.getenv("JOBS_LEASE_TIMEOUT", 60))  # Без продления дольше - воркер считается упавшим
+JOBS_MAX_ATTEMPTS = 3  # Сколько раз задание возвращается в очередь после падения воркера
+# Директории, которые можно указать в POST /index/jobs (через ":"), по умолчанию только VIDEO_DIR
+INDEX_ALLOWED_DIRS = [path for path in os.getenv("INDEX_ALLOWED_DIRS", VIDEO_DIR).split(os.pathsep) if path]
+
+# Отслеживание новых видео (main.py --mode watch)
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", 1.0))  # Пауза между опросами директорий, секунд
+WATCH_SETTLE_SECONDS = float(os.getenv("WATCH_SETTLE_SECONDS", 2.0))  # Файл готов, если не менялся столько секунд
 
 # Streamlit
 DEBUG_MODE = False
\ No newline at end of file
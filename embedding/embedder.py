@@ -1,33 +1,44 @@
 import torch
 import numpy as np
 from typing import List, Dict, Any
-from transformers import CLIPProcessor, CLIPModel
-from faster_whisper import WhisperModel
-from sentence_transformers import SentenceTransformer
-from fastembed.sparse import SparseTextEmbedding
+from models import get_registry
 import config
 
 class MultimodalEmbedder:
     def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        self.visual_model = CLIPModel.from_pretrained(config.VISUAL_MODEL).to(self.device)
-        self.visual_processor = CLIPProcessor.from_pretrained(config.VISUAL_MODEL)
-        self.text_model = SentenceTransformer(config.TEXT_MODEL).to(self.device)
-        self.text_sparse_model = SparseTextEmbedding(config.TEXT_SPARSE_MODEL)#.to(self.device)
+        # модели берутся из общего реестра процесса: загружаются при первом использовании и одни на все экземпляры
+        self.models = get_registry()
+        self.device = self.models.device
+
+    @property
+    def visual_model(self):
+        return self.models.get("clip")[0]
+
+    @property
+    def visual_processor(self):
+        return self.models.get("clip")[1]
+
+    @property
+    def text_model(self):
+        return self.models.get("text_dense")
+
+    @property
+    def text_sparse_model(self):
+        return self.models.get("text_sparse")
 
     def create_visual_embeddings(self, frames: List[np.ndarray]) -> np.ndarray:
         '''создание мультимодальных эмбеддингов из фреймов (для визуальных эмбедов)'''
         embeddings = []
         
-        for frame in frames:
-            inputs = self.visual_processor(images=frame, return_tensors="pt").to(self.device)
-            with torch.no_grad():
-                outputs = self.visual_model.get_image_features(**inputs)
-                
-            embedding = outputs.cpu().numpy()[0]
-            embedding = embedding / np.linalg.norm(embedding)
-            embeddings.append(embedding)
+        with self.models.use("clip") as (visual_model, visual_processor):
+            for frame in frames:
+                inputs = visual_processor(images=frame, return_tensors="pt").to(self.device)
+                with torch.no_grad():
+                    outputs = visual_model.get_image_features(**inputs)
+                    
+                embedding = outputs.cpu().numpy()[0]
+                embedding = embedding / np.linalg.norm(embedding)
+                embeddings.append(embedding)
             
         if embeddings:
             return np.mean(embeddings, axis=0)
@@ -40,8 +51,8 @@ class MultimodalEmbedder:
         if not text:
             return np.zeros(config.TEXT_VECTOR_SIZE)
             
-        with torch.no_grad():
-            embedding = self.text_model.encode(text)
+        with self.models.use("text_dense") as text_model, torch.no_grad():
+            embedding = text_model.encode(text)
             
         embedding = embedding / np.linalg.norm(embedding)
         
@@ -49,12 +60,13 @@ class MultimodalEmbedder:
     
     def create_text_sparse_embeddings(self, text: str):
         '''создание текстовых sparse-эмбеддингов из транскрипции'''
-        if not text:
-            with torch.no_grad():
-                embedding = list(self.text_sparse_model.embed(''))
-        else:
-            with torch.no_grad():
-                embedding = list(self.text_sparse_model.embed(text))
+        with self.models.use("text_sparse") as text_sparse_model:
+            if not text:
+                with torch.no_grad():
+                    embedding = list(text_sparse_model.embed(''))
+            else:
+                with torch.no_grad():
+                    embedding = list(text_sparse_model.embed(text))
         
         return embedding
         
@@ -62,10 +74,11 @@ class MultimodalEmbedder:
         '''создание мультимодальных эмбеддингов с CLIP (для текст запросов поиска по визуальным эмбедам)'''
         if not text:
             return np.zeros(config.VISUAL_VECTOR_SIZE)
-        inputs = self.visual_processor(text=text, return_tensors="pt").to(self.device)
-        
-        with torch.no_grad():
-            outputs = self.visual_model.get_text_features(**inputs)
+        with self.models.use("clip") as (visual_model, visual_processor):
+            inputs = visual_processor(text=text, return_tensors="pt").to(self.device)
+            
+            with torch.no_grad():
+                outputs = visual_model.get_text_features(**inputs)
             
         embedding = outputs.cpu().numpy()[0]
         embedding = embedding / np.linalg.norm(embedding)
@@ -0,0 +1,274 @@
+import json
+import os
+import re
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import config
+
+# статусы задания
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobQueue:
+    '''персистентная очередь заданий индексации на SQLite (общая для API и воркеров)'''
+
+    def __init__(self, db_path: str = None):
+        '''
+        параметры:
+            db_path: путь к файлу базы (по умолчанию config.JOBS_DB_PATH)
+        '''
+        self.db_path = db_path or config.JOBS_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    videos_dir TEXT NOT NULL,
+                    force_reindex INTEGER NOT NULL,
+                    video_paths TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            # базы, созданные до появления аренды заданий
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'heartbeat_at' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            if 'attempts' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS job_videos (
+                    job_id TEXT NOT NULL,
+                    video_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    timings TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, video_path)
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        '''отдельное соединение на каждую операцию - так очередь безопасна для потоков и процессов'''
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, videos_dir: str, force_reindex: bool = False, video_paths: Optional[List[str]] = None) -> str:
+        '''
+        постановка задания в очередь
+        параметры:
+            videos_dir: директория с видео
+            force_reindex: принудительная переиндексация
+            video_paths: индексировать только эти файлы (None - всю директорию)
+        вывод: ID задания
+        '''
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, videos_dir, force_reindex, video_paths, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, os.path.abspath(videos_dir), int(force_reindex),
+                 json.dumps(video_paths) if video_paths is not None else None, time.time())
+            )
+        return job_id
+
+    @staticmethod
+    def _is_full_rebuild(job) -> bool:
+        '''пересборка всего индекса: идет в новую версию коллекции, параллельно с ней ничего не выполняется'''
+        return bool(job['force_reindex']) and job['video_paths'] is None
+
+    @staticmethod
+    def _job_files(job) -> Optional[set]:
+        '''
+        видео задания по имени итогового файла: raw-файл и его веб-копия в videos_dir - одно видео
+        (имя приводится так же, как в VideoProcessor.plan_web_conversion); None - вся директория
+        '''
+        if job['video_paths'] is None:
+            return None
+        return {
+            re.sub(r'[^\w\-_.]', '_', os.path.splitext(os.path.basename(path))[0])
+            for path in json.loads(job['video_paths'])
+        }
+
+    def _conflicts(self, job, other) -> bool:
+        '''
+        задания делят файлы: одна пара videos_dir и raw-директории рядом с ним (в родительской директории)
+        и пересекающиеся video_paths или хотя бы одно задание на всю директорию;
+        такие задания выполняются по очереди, иначе оба конвертируют и индексируют одни файлы
+        '''
+        if os.path.dirname(job['videos_dir']) != os.path.dirname(other['videos_dir']):
+            return False
+        files, other_files = self._job_files(job), self._job_files(other)
+        return files is None or other_files is None or bool(files & other_files)
+
+    def claim_next(self, worker: str) -> Optional[Dict[str, Any]]:
+        '''
+        атомарно забрать самое старое задание, которое можно выполнять рядом с уже запущенными
+        (None - очередь пуста или все задания ждут); заодно возвращаются в очередь задания
+        воркеров, которые перестали продлевать аренду
+        '''
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._recover_stale(conn)
+            running = conn.execute("SELECT * FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            queued = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+
+            row = None
+            if not any(self._is_full_rebuild(job) for job in running):
+                # задание не обгоняет более старые ожидающие, с которыми делит файлы
+                blocking = list(running)
+                for job in queued:
+                    if self._is_full_rebuild(job):
+                        # пересборка ждет, пока закончатся запущенные задания, и более новые ее не обгоняют
+                        if not running:
+                            row = job
+                        break
+                    if not any(self._conflicts(job, other) for other in blocking):
+                        row = job
+                        break
+                    blocking.append(job)
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, worker, now, now, row['id'])
+            )
+            conn.execute("COMMIT")
+        return self.get(row['id'])
+
+    def heartbeat(self, worker_prefix: str) -> None:
+        '''продление аренды всех выполняющихся заданий воркера (имена потоков воркера начинаются с worker_prefix)'''
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker LIKE ?",
+                (time.time(), RUNNING, f"{worker_prefix}/%")
+            )
+
+    def _recover_stale(self, conn) -> None:
+        '''
+        задания, аренду которых не продлевали config.JOBS_LEASE_TIMEOUT секунд (воркер упал или перезапущен):
+        отмененные завершаются, остальные возвращаются в очередь, после config.JOBS_MAX_ATTEMPTS попыток - ошибка
+        '''
+        now = time.time()
+        stale = conn.execute(
+            "SELECT id, cancel_requested, attempts FROM jobs WHERE status = ? AND COALESCE(heartbeat_at, started_at, 0) < ?",
+            (RUNNING, now - config.JOBS_LEASE_TIMEOUT)
+        ).fetchall()
+        for job in stale:
+            if job['cancel_requested']:
+                status = CANCELLED
+                conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, now, job['id']))
+            elif job['attempts'] >= config.JOBS_MAX_ATTEMPTS:
+                status = FAILED
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                    (status, f"Воркер перестал отвечать (попыток: {job['attempts']})", now, job['id'])
+                )
+            else:
+                status = QUEUED
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, started_at = NULL, heartbeat_at = NULL WHERE id = ?",
+                    (status, job['id'])
+                )
+            print(f"Задание {job['id']} потеряло воркера, новый статус: {status}")
+
+    def update_video(self, job_id: str, video_path: str, status: str,
+                     error: Optional[str] = None, timings: Optional[Dict[str, float]] = None) -> None:
+        '''обновление прогресса по одному видео задания'''
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO job_videos (job_id, video_path, status, error, timings, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id, video_path) DO UPDATE SET
+                    status = excluded.status,
+                    error = excluded.error,
+                    timings = COALESCE(excluded.timings, job_videos.timings),
+                    updated_at = excluded.updated_at
+            ''', (job_id, video_path, status, error, json.dumps(timings) if timings else None, time.time()))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        '''завершение задания'''
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def request_cancel(self, job_id: str) -> bool:
+        '''
+        отмена задания: задание из очереди отменяется сразу, выполняющееся - после текущего видео
+        вывод: False, если задания нет или оно уже завершено
+        '''
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row['status'] in FINISHED_STATUSES:
+                conn.execute("COMMIT")
+                return False
+            if row['status'] == QUEUED:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, cancel_requested = 1, finished_at = ? WHERE id = ?",
+                    (CANCELLED, time.time(), job_id)
+                )
+            else:
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            conn.execute("COMMIT")
+        return True
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        '''задание с прогрессом и таймингами по каждому видео (None - задания нет)'''
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            video_rows = conn.execute(
+                "SELECT * FROM job_videos WHERE job_id = ? ORDER BY rowid", (job_id,)
+            ).fetchall()
+
+        job = dict(row)
+        job['force_reindex'] = bool(job['force_reindex'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['video_paths'] = json.loads(job['video_paths']) if job['video_paths'] else None
+        job['videos'] = [
+            {
+                "video_path": video['video_path'],
+                "status": video['status'],
+                "error": video['error'],
+                "timings": json.loads(video['timings']) if video['timings'] else None,
+            }
+            for video in video_rows
+        ]
+        counts = {}
+        for video in job['videos']:
+            counts[video['status']] = counts.get(video['status'], 0) + 1
+        job['progress'] = counts
+        return job
@@ -0,0 +1,121 @@
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+import config
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+
+class FolderWatcher:
+    '''
+    опрос директорий с видео: файл считается готовым, когда его размер и время изменения
+    не меняются дольше settle_seconds (защита от недописанных загрузок)
+    '''
+
+    def __init__(self, directories: List[str], settle_seconds: float = None):
+        self.directories = directories
+        self.settle_seconds = config.WATCH_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self._pending: Dict[str, Tuple[int, int, float]] = {}  # путь -> (размер, mtime_ns, когда стал таким)
+        self._handled: Dict[str, Tuple[int, int]] = {}  # путь -> (размер, mtime_ns) уже отданного файла
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        '''текущие видеофайлы всех директорий (рекурсивно), скрытые и временные файлы пропускаются'''
+        files = {}
+        stack = [d for d in self.directories if os.path.isdir(d)]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def mark_existing(self) -> None:
+        '''считать все уже лежащие файлы обработанными'''
+        self._handled = self._scan()
+        self._pending = {}
+
+    def poll(self) -> List[str]:
+        '''один опрос: список новых файлов, которые дописаны до конца'''
+        now = time.monotonic()
+        files = self._scan()
+        ready = []
+
+        for path, signature in files.items():
+            if self._handled.get(path) == signature:
+                continue
+            size, mtime_ns = signature
+            pending = self._pending.get(path)
+            if pending is None or pending[:2] != signature:
+                # файл новый или еще пишется - ждем, пока перестанет меняться
+                self._pending[path] = (size, mtime_ns, now)
+                continue
+            if size > 0 and now - pending[2] >= self.settle_seconds:
+                ready.append(path)
+                self._handled[path] = signature
+                del self._pending[path]
+
+        # забываем удаленные файлы (например, raw-файлы после конвертации)
+        for path in list(self._pending):
+            if path not in files:
+                del self._pending[path]
+        for path in list(self._handled):
+            if path not in files:
+                del self._handled[path]
+
+        return ready
+
+
+def watch_folders(index_func: Callable, videos_dir: str, poll_interval: float = None) -> None:
+    '''
+    потоковая индексация: каждый новый файл в video_examples_raw / video_examples
+    конвертируется и индексируется сразу после того, как он дописан
+    параметры:
+        index_func: функция индексации (main.index_videos)
+        videos_dir: директория с веб-совместимыми видео (raw-директория находится рядом)
+        poll_interval: пауза между опросами директорий (сек.)
+    '''
+    from video_processor.processor import VideoProcessor
+    from embedding.embedder import MultimodalEmbedder
+    from vectordb.backends import create_db_manager
+    from models import get_registry
+
+    poll_interval = poll_interval or config.WATCH_POLL_INTERVAL
+    raw_videos_dir = os.path.join(os.path.dirname(videos_dir), "video_examples_raw")
+    os.makedirs(videos_dir, exist_ok=True)
+
+    components = {
+        "processor": VideoProcessor(),
+        "embedder": MultimodalEmbedder(),
+        "db_manager": create_db_manager(),
+    }
+
+    # между заданиями простаивающие модели выгружаются (MODEL_IDLE_TIMEOUT) и загружаются снова по требованию
+    get_registry().start_idle_eviction()
+    # файлы, которые лежали до запуска, индексируем одним проходом, дальше - только новые
+    watcher = FolderWatcher([raw_videos_dir, videos_dir])
+    watcher.mark_existing()
+    index_func(videos_dir, **components)
+
+    print(f"Отслеживаем новые видео в {raw_videos_dir} и {videos_dir}")
+    while True:
+        ready = watcher.poll()
+        if ready:
+            print(f"Новые видео: {len(ready)}")
+            try:
+                index_func(videos_dir, video_paths=ready, **components)
+            except Exception as e:
+                print(f"Ошибка при индексации новых видео: {str(e)}")
+        time.sleep(poll_interval)
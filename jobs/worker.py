@@ -0,0 +1,119 @@
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import config
+from monitoring import Tracer
+from .queue import JobQueue, COMPLETED, FAILED, CANCELLED
+
+# статусы видео, после которых по нему известны тайминги этапов
+VIDEO_DONE_STATUSES = ("indexed", "duplicate", "failed")
+
+
+def _video_timings(tracer: Tracer, video_path: str) -> Dict[str, float]:
+    '''тайминги этапов одного видео (мс) из спанов трейсера'''
+    timings = {}
+    for event in tracer.events:
+        if event['args'].get('video') != video_path:
+            continue
+        name = "total" if event['name'] == "video" else event['name']
+        timings[name] = timings.get(name, 0.0) + event['dur'] / 1000
+    return timings
+
+
+def process_job(queue: JobQueue, job: Dict[str, Any], index_func: Callable, components: Dict[str, Any]) -> None:
+    '''
+    выполнение одного задания индексации
+    параметры:
+        queue: очередь заданий
+        job: задание из очереди
+        index_func: функция индексации (main.index_videos)
+        components: общие для всех заданий processor/embedder/db_manager
+    '''
+    job_id = job['id']
+    tracer = Tracer()
+
+    def progress(video_path, status, error=None):
+        timings = None
+        if status in VIDEO_DONE_STATUSES:
+            # спан "video" пишется после отчета, поэтому total считаем от спанов этапов
+            timings = _video_timings(tracer, video_path)
+        queue.update_video(job_id, video_path, status, error=error, timings=timings)
+
+    print(f"Задание {job_id}: индексация {job['videos_dir']}")
+    try:
+        summary = index_func(
+            job['videos_dir'],
+            job['force_reindex'],
+            tracer=tracer,
+            video_paths=job['video_paths'],
+            progress_callback=progress,
+            should_cancel=lambda: queue.is_cancel_requested(job_id),
+            **components
+        )
+        if summary['cancelled']:
+            queue.finish(job_id, CANCELLED)
+        elif summary.get('rebuild_error'):
+            queue.finish(job_id, FAILED, f"Пересборка не применена: {summary['rebuild_error']}")
+        else:
+            queue.finish(job_id, COMPLETED)
+        print(f"Задание {job_id} завершено: {summary}")
+    except Exception as e:
+        print(f"Задание {job_id} завершилось ошибкой: {str(e)}")
+        queue.finish(job_id, FAILED, str(e))
+
+
+def run_worker(index_func: Callable, workers: int = 1, poll_interval: float = None) -> None:
+    '''
+    воркер очереди индексации: модели из общего реестра процесса используются всеми заданиями
+    параметры:
+        index_func: функция индексации (main.index_videos)
+        workers: количество заданий, выполняемых одновременно
+        poll_interval: пауза между опросами пустой очереди (сек.)
+    '''
+    from video_processor.processor import VideoProcessor
+    from embedding.embedder import MultimodalEmbedder
+    from vectordb.backends import create_db_manager
+    from models import get_registry
+
+    poll_interval = poll_interval or config.JOBS_POLL_INTERVAL
+    queue = JobQueue()
+    components = {
+        "processor": VideoProcessor(),
+        "embedder": MultimodalEmbedder(),
+        "db_manager": create_db_manager(),
+    }
+    # между заданиями простаивающие модели выгружаются (MODEL_IDLE_TIMEOUT) и загружаются снова по требованию
+    get_registry().start_idle_eviction()
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Воркер индексации {worker_name} запущен, потоков: {workers}")
+
+    def heartbeat():
+        # аренда продлевается отдельным потоком: одно видео может обрабатываться дольше JOBS_LEASE_TIMEOUT
+        while True:
+            try:
+                queue.heartbeat(worker_name)
+            except Exception as e:
+                print(f"Не удалось продлить аренду заданий: {str(e)}")
+            time.sleep(config.JOBS_HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=heartbeat, name="jobs-heartbeat", daemon=True).start()
+
+    def loop(thread_name):
+        while True:
+            job = queue.claim_next(thread_name)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            process_job(queue, job, index_func, components)
+
+    threads = [
+        threading.Thread(target=loop, args=(f"{worker_name}/{i}",), daemon=True)
+        for i in range(max(1, workers))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
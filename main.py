@@ -1,17 +1,27 @@
 import argparse
 from video_processor.processor import VideoProcessor
 from embedding.embedder import MultimodalEmbedder
-from vectordb.qdrant_client import QdrantManager
+from vectordb.backends import create_db_manager
+from vectordb.snapshots import export_snapshot, import_snapshot
 from qdrant_client.models import SparseVector
 from api.search_api import create_app
+from jobs.worker import run_worker
+from jobs.watcher import watch_folders
 import os
+import config
+from concurrent.futures import ThreadPoolExecutor
+import cProfile
+from monitoring import export_metrics, index_stage, Tracer, NULL_TRACER
+from monitoring.metrics import INDEX_VIDEOS, INDEX_IN_FLIGHT
 
 
 
 def setup_parser():
     parser = argparse.ArgumentParser(description='Умный поиск видеороликов')
-    parser.add_argument('--mode', type=str, choices=['index', 'serve'], required=True,
-                        help='Режим работы: index - индексация видео, serve - запуск API')
+    parser.add_argument('--mode', type=str, choices=['index', 'serve', 'worker', 'watch', 'snapshot-export', 'snapshot-import'], required=True,
+                        help='Режим работы: index - индексация видео, serve - запуск API, worker - воркер очереди индексации, '
+                             'watch - индексация новых видео по мере появления, '
+                             'snapshot-export / snapshot-import - выгрузка и восстановление индекса одним архивом')
     parser.add_argument('--videos_dir', type=str, default='./video_examples',
                         help='Директория с видеофайлами для индексации')
     parser.add_argument('--host', type=str, default='0.0.0.0', 
@@ -19,55 +29,81 @@ def setup_parser():
     parser.add_argument('--port', type=int, default=8000, 
                         help='Порт для запуска API')
     parser.add_argument('--force-reindex', action='store_true', 
-                        help='Принудительная переиндексация всех видео, даже если они уже проиндексированы')
+                        help='Принудительная переиндексация всех видео, даже если они уже проиндексированы '
+                             '(в новую версию коллекции, поиск переключается на нее по окончании)')
+    parser.add_argument('--snapshot-path', type=str, default=None,
+                        help='Архив индекса: куда выгрузить (snapshot-export) или откуда восстановить (snapshot-import)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Количество заданий индексации, выполняемых воркером одновременно')
+    parser.add_argument('--metrics-file', type=str, default=None,
+                        help='Файл для сохранения метрик индексации в формате Prometheus (textfile collector)')
+    parser.add_argument('--trace', type=str, default=None,
+                        help='Файл для сохранения таймингов этапов по каждому видео (JSON в формате Chrome trace)')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Файл для сохранения профиля cProfile всего запуска индексации (.prof)')
     return parser
 
-def index_videos(videos_dir, force_reindex=False):
+def index_videos(videos_dir, force_reindex=False, tracer=NULL_TRACER, video_paths=None,
+                 progress_callback=None, should_cancel=None,
+                 processor=None, embedder=None, db_manager=None):
     '''
     индексация видео из указанной директории, умеет распознавать существующие видео и пропускать их
     параметры:
         videos_dir: Директория с видеофайлами
-        force_reindex: Флаг для принудительной переиндексации всех видео
+        force_reindex: Флаг для принудительной переиндексации всех видео (без video_paths - пересборка
+            в новую версию коллекции с переключением алиаса по окончании)
+        tracer: Трейсер для записи таймингов этапов по каждому видео (по умолчанию выключен)
+        video_paths: Индексировать только эти файлы (из videos_dir или из raw-директории), None - все
+        progress_callback: Функция (video_path, status, error) для отслеживания прогресса по каждому видео
+        should_cancel: Функция без аргументов, True - остановить индексацию перед следующим видео
+        processor, embedder, db_manager: Уже созданные компоненты (чтобы не грузить модели повторно)
+    вывод: словарь с итогами индексации
     '''
     # проверка директории
     if not os.path.exists(videos_dir):
         os.makedirs(videos_dir, exist_ok=True)
 
-    processor = VideoProcessor()
+    def report(video_path, status, error=None):
+        if progress_callback:
+            progress_callback(video_path, status, error)
+
+    processor = processor or VideoProcessor()
+    # веб-копии, брошенные упавшим воркером посреди конвертации
+    processor.cleanup_stale_temp_videos(videos_dir)
     
-    # Конвертация видео из raw-директории в директорию для индексации с правильным кодеком
+    # Видео из raw-директории конвертируются в веб-совместимый формат прямо во время индексации:
+    # один проход ffmpeg дает и веб-копию, и кадры, и аудио
     raw_videos_dir = os.path.join(os.path.dirname(videos_dir), "video_examples_raw")
+    pending_raw = {}
     try:
         if os.path.exists(raw_videos_dir):
-            processor.convert_videos_to_web_compatible(source_dir=raw_videos_dir, target_dir=videos_dir)
-            print(f"Конвертация видеокодека успешно завершена")
+            to_convert, skipped_raw = processor.plan_web_conversion(source_dir=raw_videos_dir, target_dir=videos_dir)
+            pending_raw = {target_path: source_path for source_path, target_path in to_convert}
+            print(f"Найдено {len(to_convert)} необработанных видео, пропущено (уже существуют): {len(skipped_raw)}")
         else:
             print(f"Директория с исходными видео {raw_videos_dir} не найдена. Пропускаем этап конвертации.")
     except Exception as e:
-        print(f"Ошибка при конвертации видео: {str(e)}")
+        print(f"Ошибка при подготовке конвертации видео: {str(e)}")
         
-    video_paths = processor.get_video_files(videos_dir)
+    requested_paths = video_paths
+    video_paths = processor.get_video_files(videos_dir) + list(pending_raw.keys())
+    if requested_paths is not None:
+        # файл можно указать и по итоговому пути, и по пути в raw-директории
+        requested = {os.path.abspath(path) for path in requested_paths}
+        video_paths = [
+            path for path in video_paths
+            if os.path.abspath(path) in requested or os.path.abspath(pending_raw.get(path, path)) in requested
+        ]
     print(f"Найдено {len(video_paths)} видеофайлов")
     
-    embedder = MultimodalEmbedder()
-    db_manager = QdrantManager()
+    embedder = embedder or MultimodalEmbedder()
+    db_manager = db_manager or create_db_manager()
     
     # список уже существующих видео
     indexed_videos = set()
     if not force_reindex:
         try:
-            scroll_result = db_manager.client.scroll(
-                collection_name=db_manager.collection_name,
-                limit=1000,
-                with_vectors=False
-            )
-            points = scroll_result[0]
-            
-            for point in points:
-                if 'video_path' in point.payload:
-                    indexed_path = os.path.normpath(point.payload['video_path'])
-                    indexed_videos.add(indexed_path)
-            
+            indexed_videos = db_manager.get_indexed_video_paths()
             print(f"Найдено {len(indexed_videos)} уже проиндексированных видео")
         except Exception as e:
             print(f"Ошибка при получении списка проиндексированных видео: {str(e)}")
@@ -77,75 +113,251 @@ def index_videos(videos_dir, force_reindex=False):
     skipped_videos = []
     
     for video_path in video_paths:
-        normalized_path = os.path.normpath(video_path)
-        if normalized_path in indexed_videos and not force_reindex:
+        if db_manager.normalize_video_path(video_path) in indexed_videos and not force_reindex:
             skipped_videos.append(video_path)
         else:
             new_videos.append(video_path)
     
     print(f"Видео для индексации: {len(new_videos)}")
     print(f"Пропущено уже проиндексированных видео: {len(skipped_videos)}")
+    for video_path in skipped_videos:
+        report(video_path, "skipped")
+    for video_path in new_videos:
+        report(video_path, "queued")
     
     # обрабатываем новые видео
-    for i, video_path in enumerate(new_videos, 1):
+    INDEX_VIDEOS.labels("skipped").inc(len(skipped_videos))
+    duplicate_videos = []
+    failed_videos = []
+    cancelled_videos = []
+    preview_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="previews")
+    
+    # декодирование и конвертация raw-видео идут в пуле ffmpeg на несколько видео вперед,
+    # пока основной поток занят транскрипцией и эмбеддингами текущего
+    cpu_count = os.cpu_count() or 1
+    decode_workers = max(1, min(config.CONVERT_WORKERS or cpu_count, len(new_videos) or 1))
+    # ядра делим между процессами, чтобы libx264 не дрался за них
+    ffmpeg_threads = max(1, cpu_count // decode_workers)
+    decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+    decoding = {}
+
+    def decode(video_path):
+        # параметры видео (длительность, наличие звука, размеры) читаются одним ffprobe
+        # и дальше используются и при декодировании, и в payload
+        source_path = pending_raw.get(video_path)
+        info = None
         try:
-            print(f"[{i}/{len(new_videos)}] Обработка видео: {video_path}")
+            with index_stage("decode", tracer, video=video_path):
+                info = processor.probe_video(source_path or video_path)
+                if source_path:
+                    # веб-копия сохраняет размеры, fps и длительность исходника
+                    frames, audio_path = processor.decode_video(source_path, web_output_path=video_path,
+                                                                threads=ffmpeg_threads, info=info)
+                    os.remove(source_path)
+                    print(f"  - Видео {video_path} сконвертировано из {source_path}")
+                else:
+                    frames, audio_path = processor.decode_video(video_path, threads=ffmpeg_threads, info=info)
+        except Exception as e:
+            if source_path:
+                raise
+            print(f"  - Единое декодирование {video_path} не удалось ({str(e)}), извлекаем кадры и аудио раздельно")
+            with index_stage("decode", tracer, video=video_path):
+                frames = processor.extract_frames(video_path)
+            with index_stage("audio", tracer, video=video_path):
+                audio_path = processor.extract_audio(video_path)
+        return frames, audio_path, info
+
+    def prefetch(index):
+        # в работе текущее видео и decode_workers следующих за ним
+        for ahead in range(index, min(index + decode_workers + 1, len(new_videos))):
+            if ahead not in decoding:
+                decoding[ahead] = decode_pool.submit(decode, new_videos[ahead])
+
+    # полная пересборка идет в новую версию коллекции через отдельный менеджер: общий db_manager
+    # (поиск, другие задания воркера) до переключения работает со старой версией
+    rebuild_db = None
+    if force_reindex and requested_paths is None:
+        rebuild_db = db_manager.begin_rebuild()
+    target_db = rebuild_db or db_manager
+
+    try:
+        for i, video_path in enumerate(new_videos, 1):
+            if should_cancel and should_cancel():
+                cancelled_videos = new_videos[i - 1:]
+                print(f"Индексация отменена, не обработано видео: {len(cancelled_videos)}")
+                for cancelled_path in cancelled_videos:
+                    report(cancelled_path, "cancelled")
+                break
+        
+            report(video_path, "running")
+            INDEX_IN_FLIGHT.inc()
+            video_started = tracer.now()
+            try:
+                print(f"[{i}/{len(new_videos)}] Обработка видео: {video_path}")
             
-            frames = processor.extract_frames(video_path)            
-#            preview_path = processor.save_preview_image(video_path)
+                prefetch(i - 1)
+                frames, audio_path, info = decoding.pop(i - 1).result()
+                # дешевая проверка на дубликат до транскрипции и эмбеддингов
+                with index_stage("fingerprint", tracer, video=video_path):
+                    fingerprint = processor.compute_fingerprint(frames)
+                    # у видео без звука WAV - секунда тишины, поэтому длительность берется из ffprobe
+                    duration = info['duration'] if info else processor.get_audio_duration(audio_path)
+                    duplicate = None
+                    if config.DUPLICATE_DETECTION:
+                        duplicate = target_db.find_duplicate(fingerprint, duration, video_path)
+                if duplicate:
+                    target_db.link_duplicate(duplicate['id'], video_path)
+                    duplicate_videos.append(video_path)
+                    INDEX_VIDEOS.labels("duplicate").inc()
+                    print(f"  - Дубликат видео {duplicate['video_path']}, привязан без повторной индексации")
+                    processor.cleanup_temp_file(audio_path)
+                    report(video_path, "duplicate")
+                    continue
             
-#            if preview_path and os.path.exists(preview_path):
-#                preview_rel_path = os.path.join("previews", os.path.basename(preview_path))
-#            else:
-#                preview_rel_path = None
+                # превью кодируются в фоне из тех же кадров, пока идут транскрипция и эмбеддинги
+                preview_paths = processor.preview_paths(fingerprint)
+                preview_pool.submit(processor.save_preview_image, frames, fingerprint)
             
-            audio_path = processor.extract_audio(video_path)
-            transcript = processor.transcribe_audio(audio_path)
+                if info and not info['has_audio']:
+                    # без аудиодорожки транскрибировать нечего, а язык whisper угадал бы по тишине
+                    transcript, language = "", None
+                else:
+                    with index_stage("asr", tracer, video=video_path):
+                        transcript, language = processor.transcribe_audio_with_language(audio_path)
+                video_metadata = processor.video_metadata(video_path, info)
             
-            # эмбеды
-            visual_embeds = embedder.create_visual_embeddings(frames)
-            text_dense_embeds = embedder.create_text_embeddings(transcript)
-            text_sparse_embeds = embedder.create_text_sparse_embeddings(transcript)
+                # эмбеды
+                with index_stage("embed", tracer, video=video_path):
+                    visual_embeds = embedder.create_visual_embeddings(frames)
+                    text_dense_embeds = embedder.create_text_embeddings(transcript)
+                    text_sparse_embeds = embedder.create_text_sparse_embeddings(transcript)
 
-            # сохраняем в БД
-            video_id = db_manager.index_video(
-                video_path=video_path,
-                visual_embeds=visual_embeds,
-                text_dense_embeds=text_dense_embeds,
-                text_sparse_embeds=text_sparse_embeds[0],
-                metadata={
-                    "transcript": transcript,
-                    "frames_count": len(frames),
-                    "preview_path": '-'
-                }
-            )
+                # сохраняем в БД
+                with index_stage("upsert", tracer, video=video_path):
+                    video_id = target_db.index_video(
+                        video_path=video_path,
+                        visual_embeds=visual_embeds,
+                        text_dense_embeds=text_dense_embeds,
+                        text_sparse_embeds=text_sparse_embeds[0],
+                        metadata={
+                            "transcript": transcript,
+                            "frames_count": len(frames),
+                            "preview_path": preview_paths["preview_path"] or '-',
+                            "sprite_path": preview_paths["sprite_path"],
+                            "fingerprint": fingerprint,
+                            "duration": duration,
+                            "language": language,
+                            **video_metadata,
+                            "duplicates": []
+                        }
+                    )
             
-            print(f"  - Видео успешно проиндексировано с ID: {video_id}")
+                INDEX_VIDEOS.labels("indexed").inc()
+                print(f"  - Видео успешно проиндексировано с ID: {video_id}")
             
-            # чистим временный файл
-            processor.cleanup_temp_file(audio_path)
-            
-        except Exception as e:
-            print(f"Ошибка при обработке видео {video_path}: {str(e)}")
-            if 'audio_path' in locals():
+                # чистим временный файл
                 processor.cleanup_temp_file(audio_path)
+                report(video_path, "indexed")
+            
+            except Exception as e:
+                print(f"Ошибка при обработке видео {video_path}: {str(e)}")
+                failed_videos.append(video_path)
+                INDEX_VIDEOS.labels("failed").inc()
+                if 'audio_path' in locals():
+                    processor.cleanup_temp_file(audio_path)
+                report(video_path, "failed", str(e))
+            finally:
+                INDEX_IN_FLIGHT.dec()
+                tracer.record("video", video_started, video=video_path)
+    except BaseException:
+        # при любой ошибке новая версия удаляется, поиск остается на старой
+        if rebuild_db:
+            db_manager.abort_rebuild(rebuild_db)
+        raise
+    finally:
+        # декодированные впрок видео (после отмены или ошибки): временные WAV удаляются
+        for future in decoding.values():
+            if not future.cancel() and future.exception() is None:
+                processor.cleanup_temp_file(future.result()[1])
+        decode_pool.shutdown(wait=True)
+        with index_stage("previews", tracer):
+            preview_pool.shutdown(wait=True)
+    
+    indexed_count = len(new_videos) - len(duplicate_videos) - len(failed_videos) - len(cancelled_videos)
+    rebuild_error = None
+    if rebuild_db:
+        # алиас переключается, только если новая версия не хуже: иначе пустая или неполная
+        # пересборка (нет видео, все упали) подменила бы рабочий индекс
+        if cancelled_videos:
+            rebuild_error = "индексация отменена"
+        elif len(failed_videos) > config.REBUILD_MAX_FAILED:
+            rebuild_error = f"не удалось проиндексировать {len(failed_videos)} видео (допустимо {config.REBUILD_MAX_FAILED})"
+        elif indexed_count == 0:
+            rebuild_error = "не проиндексировано ни одного видео"
+        elif rebuild_db.count_videos() < indexed_count:
+            rebuild_error = f"в новой версии меньше точек, чем проиндексировано видео ({indexed_count})"
+        if rebuild_error is None:
+            try:
+                db_manager.finish_rebuild(rebuild_db)
+            except Exception as e:
+                rebuild_error = f"ошибка переключения: {str(e)}"
+        if rebuild_error:
+            print(f"Пересборка не применена ({rebuild_error}), поиск остается на прежней версии индекса")
+            db_manager.abort_rebuild(rebuild_db)
     
     print("\nИндексация завершена!")
-    print(f"Всего проиндексировано: {len(new_videos)} видео")
+    print(f"Всего проиндексировано: {indexed_count} видео")
+    print(f"Привязано дубликатов: {len(duplicate_videos)}")
+    print(f"Не удалось проиндексировать: {len(failed_videos)}")
     print(f"Пропущено: {len(skipped_videos)} видео")
 
+    return {
+        "indexed": indexed_count,
+        "duplicates": len(duplicate_videos),
+        "failed": len(failed_videos),
+        "skipped": len(skipped_videos),
+        "cancelled": len(cancelled_videos),
+        "rebuild_error": rebuild_error,
+    }
+
 
 def main():
     parser = setup_parser()
     args = parser.parse_args()
     
     if args.mode == 'index':
-        index_videos(args.videos_dir, args.force_reindex)
+        tracer = Tracer() if args.trace else NULL_TRACER
+        profile = cProfile.Profile() if args.profile else None
+        try:
+            if profile:
+                profile.enable()
+            index_videos(args.videos_dir, args.force_reindex, tracer=tracer)
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats(args.profile)
+                print(f"Профиль индексации сохранен в {args.profile}")
+            if args.trace:
+                tracer.save(args.trace)
+                print(f"Трейс индексации сохранен в {args.trace}")
+            if args.metrics_file:
+                export_metrics(args.metrics_file)
+                print(f"Метрики индексации сохранены в {args.metrics_file}")
     elif args.mode == 'serve':
         print(f"Запуск API на http://{args.host}:{args.port}")
         app = create_app()
         import uvicorn
         uvicorn.run(app, host=args.host, port=args.port)
+    elif args.mode == 'worker':
+        run_worker(index_videos, workers=args.workers)
+    elif args.mode == 'watch':
+        watch_folders(index_videos, args.videos_dir)
+    elif args.mode == 'snapshot-export':
+        export_snapshot(create_db_manager(), args.snapshot_path)
+    elif args.mode == 'snapshot-import':
+        if not args.snapshot_path:
+            parser.error("для snapshot-import нужен --snapshot-path")
+        import_snapshot(create_db_manager(), args.snapshot_path, videos_dir=args.videos_dir)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,3 @@
+from .registry import ModelRegistry, get_registry
+
+__all__ = ['ModelRegistry', 'get_registry']
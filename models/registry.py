@@ -0,0 +1,205 @@
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+import config
+from monitoring.metrics import MODEL_LOADS, MODEL_MEMORY_BYTES
+
+
+def _process_rss() -> Optional[int]:
+    '''текущий RSS процесса в байтах (linux, иначе None)'''
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _tensor_bytes(model: Any) -> Optional[int]:
+    '''размер параметров и буферов torch-модели (у whisper на CTranslate2 и BM25 не считается)'''
+    modules = [part for part in (model if isinstance(model, tuple) else (model,)) if isinstance(part, torch.nn.Module)]
+    if not modules:
+        return None
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for module in modules
+        for tensor in list(module.parameters()) + list(module.buffers())
+    )
+
+
+def _load_whisper():
+    from faster_whisper import WhisperModel
+    return WhisperModel(config.TRANSCRIBE_MODEL, device=ModelRegistry.device)
+
+
+def _load_clip():
+    from transformers import CLIPProcessor, CLIPModel
+    model = CLIPModel.from_pretrained(config.VISUAL_MODEL).to(ModelRegistry.device)
+    return model, CLIPProcessor.from_pretrained(config.VISUAL_MODEL)
+
+
+def _load_text_dense():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(config.TEXT_MODEL).to(ModelRegistry.device)
+
+
+def _load_text_sparse():
+    from fastembed.sparse import SparseTextEmbedding
+    return SparseTextEmbedding(config.TEXT_SPARSE_MODEL)
+
+
+class _ModelSlot:
+    '''одна модель реестра: загрузчик, загруженный объект и статистика использования'''
+
+    def __init__(self, loader: Callable[[], Any]):
+        self.loader = loader
+        self.model = None
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.loads = 0
+        self.last_used = 0.0
+        self.load_seconds = None
+        self.memory_bytes = None
+
+
+class ModelRegistry:
+    '''
+    общий для процесса реестр моделей: каждая модель загружается при первом обращении
+    и одна на все VideoProcessor, MultimodalEmbedder и API; модели, к которым не обращались
+    config.MODEL_IDLE_TIMEOUT секунд, выгружаются и при следующем обращении загружаются снова
+    '''
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def __init__(self):
+        self._slots: Dict[str, _ModelSlot] = {
+            "whisper": _ModelSlot(_load_whisper),
+            "clip": _ModelSlot(_load_clip),
+            "text_dense": _ModelSlot(_load_text_dense),
+            "text_sparse": _ModelSlot(_load_text_sparse),
+        }
+        self._reaper = None
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        '''добавление (или замена) модели с загрузчиком без аргументов'''
+        self.unload(name)
+        self._slots[name] = _ModelSlot(loader)
+
+    def get(self, name: str) -> Any:
+        '''модель по имени, при необходимости загружается'''
+        slot = self._slots[name]
+        with slot.lock:
+            if slot.model is None:
+                self._load(name, slot)
+            slot.last_used = time.monotonic()
+            return slot.model
+
+    @contextmanager
+    def use(self, name: str):
+        '''модель на время использования: пока блок выполняется, она не выгружается по простою'''
+        slot = self._slots[name]
+        with slot.lock:
+            if slot.model is None:
+                self._load(name, slot)
+            slot.in_use += 1
+            model = slot.model
+        try:
+            yield model
+        finally:
+            with slot.lock:
+                slot.in_use -= 1
+                slot.last_used = time.monotonic()
+
+    def _load(self, name: str, slot: _ModelSlot) -> None:
+        print(f"Загрузка модели {name}...")
+        rss_before = _process_rss()
+        started = time.perf_counter()
+        slot.model = slot.loader()
+        slot.load_seconds = time.perf_counter() - started
+        rss_after = _process_rss()
+        # для torch-моделей точный размер тензоров, для остальных - прирост RSS при загрузке
+        slot.memory_bytes = _tensor_bytes(slot.model)
+        if slot.memory_bytes is None and rss_before is not None and rss_after is not None:
+            slot.memory_bytes = max(0, rss_after - rss_before)
+        slot.loads += 1
+        MODEL_LOADS.labels(name).inc()
+        MODEL_MEMORY_BYTES.labels(name).set(slot.memory_bytes or 0)
+        print(f"Модель {name} загружена за {slot.load_seconds:.1f} с")
+
+    def unload(self, name: str) -> bool:
+        '''
+        выгрузка модели (если она сейчас не используется)
+        вывод: True если модель была выгружена
+        '''
+        slot = self._slots.get(name)
+        if slot is None:
+            return False
+        with slot.lock:
+            if slot.model is None or slot.in_use:
+                return False
+            slot.model = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        MODEL_MEMORY_BYTES.labels(name).set(0)
+        print(f"Модель {name} выгружена")
+        return True
+
+    def evict_idle(self, idle_seconds: Optional[float] = None) -> List[str]:
+        '''
+        выгрузка моделей, простаивающих дольше idle_seconds (по умолчанию config.MODEL_IDLE_TIMEOUT)
+        вывод: имена выгруженных моделей
+        '''
+        idle_seconds = config.MODEL_IDLE_TIMEOUT if idle_seconds is None else idle_seconds
+        now = time.monotonic()
+        evicted = []
+        for name, slot in list(self._slots.items()):
+            if slot.model is None or slot.in_use or now - slot.last_used <= idle_seconds:
+                continue
+            if self.unload(name):
+                evicted.append(name)
+        return evicted
+
+    def start_idle_eviction(self) -> None:
+        '''фоновая выгрузка простаивающих моделей (ничего не делает при MODEL_IDLE_TIMEOUT = 0)'''
+        if config.MODEL_IDLE_TIMEOUT <= 0 or self._reaper is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(max(1.0, min(60.0, config.MODEL_IDLE_TIMEOUT / 4)))
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=loop, name="model-idle-eviction", daemon=True)
+        self._reaper.start()
+
+    def report(self) -> Dict[str, Any]:
+        '''состояние моделей: загружена ли, память, число загрузок, время простоя'''
+        now = time.monotonic()
+        return {
+            "device": self.device,
+            "process_rss_bytes": _process_rss(),
+            "idle_timeout_seconds": config.MODEL_IDLE_TIMEOUT,
+            "models": {
+                name: {
+                    "loaded": slot.model is not None,
+                    "in_use": slot.in_use,
+                    "memory_bytes": slot.memory_bytes if slot.model is not None else 0,
+                    "loads": slot.loads,
+                    "load_seconds": slot.load_seconds,
+                    "idle_seconds": round(now - slot.last_used, 1) if slot.loads else None,
+                }
+                for name, slot in self._slots.items()
+            },
+        }
+
+
+_registry = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    '''общий реестр моделей процесса'''
+    return _registry
@@ -0,0 +1,4 @@
+from .metrics import metrics_response, export_metrics
+from .tracing import Tracer, NULL_TRACER, index_stage
+
+__all__ = ['metrics_response', 'export_metrics', 'Tracer', 'NULL_TRACER', 'index_stage']
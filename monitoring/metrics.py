@@ -0,0 +1,76 @@
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, write_to_textfile
+from fastapi import Response
+
+# бакеты от миллисекунд (кэш, qdrant) до минут (транскрипция длинных видео)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# поиск
+SEARCH_REQUEST_SECONDS = Histogram(
+    'video_search_request_seconds',
+    'Полное время обработки запроса /search',
+    buckets=LATENCY_BUCKETS
+)
+SEARCH_STAGE_SECONDS = Histogram(
+    'video_search_stage_seconds',
+    'Время этапов поиска: index_generation, dense_encode, semantic_cache_lookup, clip_encode, sparse_encode, hybrid_search, semantic_cache_upsert',
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+SEARCH_IN_FLIGHT = Gauge(
+    'video_search_in_flight',
+    'Запросы /search, обрабатываемые в данный момент'
+)
+CACHE_EVENTS = Counter(
+    'video_search_cache_events_total',
+    'Попадания, промахи и вытеснения кэшей поиска',
+    ['cache', 'event']
+)
+
+# индексация
+INDEX_STAGE_SECONDS = Histogram(
+    'video_index_stage_seconds',
+    'Время этапов индексации одного видео: decode, audio, fingerprint, asr, embed, upsert; previews - ожидание фоновых превью в конце запуска',
+    ['stage'],
+    buckets=LATENCY_BUCKETS
+)
+INDEX_VIDEOS = Counter(
+    'video_index_videos_total',
+    'Обработанные при индексации видео по итогу: indexed, duplicate, skipped, failed',
+    ['status']
+)
+INDEX_IN_FLIGHT = Gauge(
+    'video_index_in_flight',
+    'Видео, индексируемые в данный момент'
+)
+
+# векторная БД
+VECTORDB_DEGRADED = Gauge(
+    'video_vectordb_degraded',
+    'Векторная БД работает в резервном режиме (1) или штатно (0)'
+)
+
+# модели
+MODEL_LOADS = Counter(
+    'video_model_loads_total',
+    'Загрузки моделей реестром (повторные - после выгрузки по простою)',
+    ['model']
+)
+MODEL_MEMORY_BYTES = Gauge(
+    'video_model_memory_bytes',
+    'Память загруженной модели (0 - выгружена)',
+    ['model']
+)
+
+
+def metrics_response() -> Response:
+    '''ответ для эндпоинта /metrics в текстовом формате Prometheus'''
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+
+def export_metrics(path: str) -> None:
+    '''
+    сохранение метрик в файл (формат textfile collector node_exporter), для запусков из CLI
+    параметры:
+        path: путь к файлу .prom
+    '''
+    write_to_textfile(path, REGISTRY)
@@ -0,0 +1,50 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+import uuid
+from typing import Optional
+
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "profiles")
+
+
+def start_profile() -> cProfile.Profile:
+    '''запуск cProfile для одного запроса'''
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def save_profile(profile: cProfile.Profile, prefix: str) -> str:
+    '''
+    остановка профилировщика и сохранение результата: .prof (для snakeviz/pstats) и .txt (топ функций)
+    параметры:
+        profile: запущенный профилировщик
+        prefix: префикс имени файла (например, "search")
+    вывод: ID профиля
+    '''
+    profile.disable()
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    profile_id = f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    profile.dump_stats(os.path.join(PROFILES_DIR, f"{profile_id}.prof"))
+
+    summary = io.StringIO()
+    pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(50)
+    with open(os.path.join(PROFILES_DIR, f"{profile_id}.txt"), 'w', encoding='utf-8') as f:
+        f.write(summary.getvalue())
+
+    return profile_id
+
+
+def load_profile_summary(profile_id: str) -> Optional[str]:
+    '''текстовая сводка сохраненного профиля (None, если профиля нет)'''
+    if not re.fullmatch(r'[\w\-]+', profile_id):
+        return None
+    path = os.path.join(PROFILES_DIR, f"{profile_id}.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return f.read()
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List
+
+from .metrics import INDEX_STAGE_SECONDS
+
+
+class Tracer:
+    '''сбор таймингов этапов (спанов) в формате Chrome trace (chrome://tracing, Perfetto)'''
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def record(self, name: str, started: float, **args) -> None:
+        '''
+        добавление завершенного спана
+        параметры:
+            name: название этапа
+            started: время начала (из now())
+            args: дополнительные поля спана (например, путь к видео)
+        '''
+        finished = time.perf_counter()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": (started - self._origin) * 1e6,
+            "dur": (finished - started) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, **args):
+        '''спан на время выполнения блока with'''
+        started = self.now()
+        try:
+            yield
+        finally:
+            self.record(name, started, **args)
+
+    def save(self, path: str) -> None:
+        '''сохранение трейса в JSON'''
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+class NullTracer:
+    '''трейсер-заглушка: ничего не записывает, используется когда трассировка выключена'''
+
+    _null_context = nullcontext()
+
+    def now(self) -> float:
+        return 0.0
+
+    def record(self, name: str, started: float, **args) -> None:
+        pass
+
+    def span(self, name: str, **args):
+        return self._null_context
+
+
+NULL_TRACER = NullTracer()
+
+
+@contextmanager
+def index_stage(stage: str, tracer=NULL_TRACER, **args):
+    '''этап индексации: время идет и в метрики, и (если включен) в трейс'''
+    with INDEX_STAGE_SECONDS.labels(stage).time(), tracer.span(stage, **args):
+        yield
@@ -2,7 +2,8 @@ import streamlit as st
 import requests
 import os
 import sys
-from main import index_videos
+import time
+import hashlib
 import config
 
 st.set_page_config(
@@ -20,6 +21,51 @@ st.title("Умный поиск видеороликов")
 
 # API URL - используем переменную окружения или имя сервиса в docker-compose
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_RETRIES = 3
+
+
+def upload_file_chunked(uploaded_file):
+    '''
+    потоковая загрузка файла в API частями с докачкой после обрыва и проверкой SHA-256;
+    после загрузки API сам ставит файл в очередь индексации
+    '''
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(UPLOAD_CHUNK_SIZE), b''):
+        digest.update(chunk)
+
+    response = requests.post(
+        f"{API_URL}/uploads",
+        json={"filename": uploaded_file.name, "size": uploaded_file.size, "sha256": digest.hexdigest()}
+    )
+    response.raise_for_status()
+    upload = response.json()
+
+    retries = 0
+    while upload['received'] < upload['size']:
+        uploaded_file.seek(upload['received'])
+        chunk = uploaded_file.read(UPLOAD_CHUNK_SIZE)
+        try:
+            response = requests.put(
+                f"{API_URL}/uploads/{upload['id']}",
+                params={"offset": upload['received']},
+                data=chunk
+            )
+            response.raise_for_status()
+            upload = response.json()
+            retries = 0
+        except requests.RequestException:
+            retries += 1
+            if retries > UPLOAD_RETRIES:
+                raise
+            # после обрыва продолжаем с того байта, который API успел принять
+            upload = requests.get(f"{API_URL}/uploads/{upload['id']}").json()
+
+    response = requests.post(f"{API_URL}/uploads/{upload['id']}/complete")
+    response.raise_for_status()
+    return response.json()
+
 tab1, tab2 = st.tabs(["Поиск видео", "Загрузка видео"])
 
 # Вкладка 1: Поиск видео
@@ -28,13 +74,27 @@ with tab1:
     st.header("Поиск видео")
     query = st.text_input("Введите запрос для поиска")
 
+    filters = {}
+    with st.expander("Фильтры"):
+        languages = st.multiselect("Язык речи", ["ru", "en", "de", "fr", "es", "uk", "kk"])
+        if languages:
+            filters["language"] = languages
+        use_duration = st.checkbox("Ограничить длительность")
+        if use_duration:
+            min_duration, max_duration = st.slider("Длительность, сек.", 0, 3600, (0, 600))
+            filters["duration"] = {"gte": min_duration, "lte": max_duration}
+        min_height = st.selectbox("Минимальное разрешение", [0, 360, 480, 720, 1080],
+                                  format_func=lambda height: f"{height}p" if height else "любое")
+        if min_height:
+            filters["height"] = {"gte": min_height}
+
     if st.button("Искать", key="search_button") or query:
         if query:
             st.subheader(f"Результаты поиска по запросу: '{query}'")
             
             response = requests.post(
                 f"{API_URL}/search",
-                json={"query": query, "limit": config.SEARCH_LIMIT}
+                json={"query": query, "limit": config.SEARCH_LIMIT, "filters": filters or None}
             )
             
             if response.status_code == 200:
@@ -56,7 +116,18 @@ with tab1:
                         score = result.get('score', 0)
                         
                         with col1:
-                            if video_path:
+                            sprite_path = result.get('sprite_path')
+                            if preview_path and preview_path.startswith('/static/'):
+                                # превью грузит браузер напрямую из API (с долгим кэшированием), без байтов видео
+                                st.image(f"{config.PUBLIC_API_URL}{preview_path}", use_column_width=True)
+                                if sprite_path:
+                                    with st.expander("Кадры"):
+                                        st.image(f"{config.PUBLIC_API_URL}{sprite_path}", use_column_width=True)
+                                play_video = st.checkbox("Смотреть видео", key=f"play_{i}_{result.get('id')}")
+                            else:
+                                # у видео, проиндексированных до появления превью, показываем сам ролик
+                                play_video = True
+                            if play_video and video_path:
                                 # Если путь начинается с /app, исправляем его для локальной системы
                                 if video_path.startswith('/app/'):
                                     video_file_path = video_path.replace('/app/', '')
@@ -73,7 +144,7 @@ with tab1:
                                 except Exception as e:
                                     st.error(f"Ошибка при воспроизведении видео: {str(e)}")
                                     st.write(f"Пути к видео: оригинальный={video_path}, локальный={video_file_path}")
-                            else:
+                            elif play_video:
                                 st.warning("Видео не найдено")
                         
                         with col2:
@@ -116,21 +187,26 @@ with tab2:
             status_text = st.empty()
             
             st.session_state.uploaded_files = new_uploads
+            queued_count = 0
             for i, uploaded_file in enumerate(new_uploads):
                 progress = (i + 1) / len(new_uploads)
                 progress_bar.progress(progress)
                 status_text.text(f"Загрузка {i+1} из {len(new_uploads)}: {uploaded_file.name}")
-                file_path = os.path.join(upload_dir, uploaded_file.name)
-                with open(file_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
+                try:
+                    upload = upload_file_chunked(uploaded_file)
+                    if upload.get('job_id'):
+                        queued_count += 1
+                except Exception as e:
+                    st.error(f"Не удалось загрузить {uploaded_file.name}: {str(e)}")
             
-            status_text.text(f"Загружено {len(new_uploads)} файлов")
+            status_text.text(f"Загружено {len(new_uploads)} файлов, поставлено в очередь индексации: {queued_count}")
             if config.DEBUG_MODE:
                 st.success(f"Видеофайлы успешно загружены в директорию {upload_dir}")
             
             st.subheader("Загруженные файлы:")
             for file in os.listdir(upload_dir):
-                st.write(f"- {file}")
+                if not file.startswith('.'):
+                    st.write(f"- {file}")
         
         
     # Опция запуска индексации
@@ -145,54 +221,61 @@ with tab2:
         else:
             force_reindex = False
 
-    with col2:
-        delete_source = True
-        
     if st.button("Запустить индексацию"):
+        # индексация выполняется воркером очереди, в процессе streamlit модели не грузятся
+        response = requests.post(
+            f"{API_URL}/index/jobs",
+            json={"videos_dir": videos_dir, "force_reindex": force_reindex}
+        )
+        if response.status_code == 202:
+            st.session_state.index_job_id = response.json()['id']
+        else:
+            st.error(f"Не удалось запустить индексацию: {response.status_code}")
+
+    if st.session_state.get('index_job_id'):
+        job_id = st.session_state.index_job_id
+        if st.button("Отменить индексацию"):
+            requests.post(f"{API_URL}/index/jobs/{job_id}/cancel")
+
+        progress_bar = st.progress(0)
+        status_text = st.empty()
         with st.spinner("Индексация видео..."):
-            # Перенаправляем вывод, чтобы показать логи в Streamlit
-            import io
-            from contextlib import redirect_stdout
-            f = io.StringIO()
-            with redirect_stdout(f):
-                try:
-                    index_videos(videos_dir, force_reindex)
-                    success = True
-                except Exception as e:
-                    success = False
-                    error_message = str(e)
-            output = f.getvalue()
-                    
-            if success:
-                st.success("Индексация успешно завершена!")
-                        
-                if delete_source and os.path.exists(upload_dir):
-                    deleted_count = 0
-                    failed_count = 0
-                            
-                    for file in os.listdir(upload_dir):
-                        source_path = os.path.join(upload_dir, file)
-                        try:
-                            os.remove(source_path)
-                            deleted_count += 1
-                        except Exception as e:
-                            st.error(f"Не удалось удалить файл {file}: {str(e)}")
-                            failed_count += 1
-                            
-                    if deleted_count > 0:
-                        st.success(f"Удалено {deleted_count} исходных файлов")
-                    if failed_count > 0:
-                        st.warning(f"Не удалось удалить {failed_count} файлов")
-                        
-                if config.DEBUG_MODE:
-                    with st.expander("Подробности индексации"):
-                        st.code(output)
-            else:
-                st.error(f"Ошибка при индексации видео: {error_message}")
-                if config.DEBUG_MODE:
-                    with st.expander("Детали ошибки"):
-                        st.code(output)
-                        st.code(error_message)
+            while True:
+                response = requests.get(f"{API_URL}/index/jobs/{job_id}")
+                if response.status_code != 200:
+                    st.error(f"Не удалось получить статус индексации: {response.status_code}")
+                    job = None
+                    break
+                job = response.json()
+
+                total = len(job['videos'])
+                done = sum(1 for video in job['videos'] if video['status'] not in ("queued", "running"))
+                progress_bar.progress(done / total if total else 0.0)
+                if job['status'] == "queued":
+                    status_text.text("Задание ожидает свободного воркера")
+                else:
+                    status_text.text(f"Обработано {done} из {total} видео")
+
+                if job['status'] not in ("queued", "running"):
+                    break
+                time.sleep(1)
+        st.session_state.index_job_id = None
+
+        if job and job['status'] == "completed":
+            # исходные файлы сконвертированных видео удаляет сама индексация, остальные
+            # файлы raw-директории (загрузки других заданий, .uploads) не трогаем
+            st.success("Индексация успешно завершена!")
+
+            if config.DEBUG_MODE:
+                with st.expander("Подробности индексации"):
+                    st.json(job)
+        elif job and job['status'] == "cancelled":
+            st.warning("Индексация отменена")
+        elif job:
+            st.error(f"Ошибка при индексации видео: {job['error']}")
+            if config.DEBUG_MODE:
+                with st.expander("Детали ошибки"):
+                    st.json(job)
 
 # Информация в сайдбаре
 with st.sidebar:
@@ -207,4 +290,4 @@ with st.sidebar:
     st.write('''Загрузка видео:
 1. Нажмите на кнопку "Browse files" и выберите видео для загрузки
 2. Для загрузки видео нажмите кнопку "Загрузить файлы"
-3. После успешной загрузки, нажмите на кнопку "Запустить индексацию" и дождитесь сообщения "Индексация успешно завершена!"''')
\ No newline at end of file
+3. Загруженные видео индексируются автоматически; для полной индексации нажмите на кнопку "Запустить индексацию" и дождитесь сообщения "Индексация успешно завершена!"''')
\ No newline at end of file
@@ -1,3 +1,6 @@
 from .qdrant_client import QdrantManager
+from .numpy_index import NumpyIndexManager
+from .backends import create_db_manager
+from .snapshots import export_snapshot, import_snapshot
 
-__all__ = ['QdrantManager'] 
\ No newline at end of file
+__all__ = ['QdrantManager', 'NumpyIndexManager', 'create_db_manager', 'export_snapshot', 'import_snapshot']
@@ -0,0 +1,10 @@
+import config
+from .qdrant_client import QdrantManager
+
+
+def create_db_manager() -> QdrantManager:
+    '''менеджер векторной БД по config.VECTOR_BACKEND: "qdrant" (сервер) или "numpy" (встроенный индекс)'''
+    if config.VECTOR_BACKEND == "numpy":
+        from .numpy_index import NumpyIndexManager
+        return NumpyIndexManager()
+    return QdrantManager()
@@ -0,0 +1,485 @@
+import os
+import copy
+import json
+import shutil
+import uuid
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from qdrant_client.models import ScoredPoint, PayloadSchemaType
+import config
+from .qdrant_client import QdrantManager, PAYLOAD_INDEXES
+
+try:
+    import fcntl
+except ImportError:  # windows: блокировка между процессами недоступна
+    fcntl = None
+
+
+class _PointStore:
+    '''
+    хранилище точек одной коллекции на диске:
+        <name>.bin - dense-векторы подряд (читаются через memmap)
+        <name>.sparse.jsonl - sparse-векторы по строке на точку (в памяти - инвертированный индекс)
+        points.jsonl - журнал добавлений и изменений payload; точка существует, только когда записана сюда
+    файлы только дописываются, поэтому читатели в других процессах подхватывают изменения по размеру журнала
+    '''
+
+    def __init__(self, directory: str, dense: Dict[str, int], sparse: List[str] = (), dtype: str = "float32"):
+        self.directory = directory
+        self.dense_dims = dense
+        self.sparse_names = list(sparse)
+        self.dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+
+        self.ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.payloads: List[Dict[str, Any]] = []
+        self._dense: Dict[str, np.ndarray] = {}
+        self._postings = {name: {} for name in self.sparse_names}  # термин -> ([строки], [веса])
+        self._compiled = {name: {} for name in self.sparse_names}  # термин -> (np строки, np веса)
+        self._sparse_rows = {name: 0 for name in self.sparse_names}
+        self._sparse_offsets = {name: 0 for name in self.sparse_names}
+        self._log_offset = 0
+        self._columns: Dict[Tuple[str, bool], np.ndarray] = {}  # поле payload -> значения по строкам (для фильтров)
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _read_lines(self, path: str, offset: int) -> Tuple[List[str], int]:
+        '''новые полностью записанные строки файла начиная с offset'''
+        if not os.path.exists(path) or os.path.getsize(path) <= offset:
+            return [], offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        return data[:end].decode('utf-8').splitlines(), offset + end
+
+    def refresh(self) -> None:
+        '''подхватить точки, дописанные с прошлого раза (в том числе другими процессами)'''
+        with self._lock:
+            lines, self._log_offset = self._read_lines(self._path("points.jsonl"), self._log_offset)
+            if not lines:
+                return
+
+            self._columns = {}
+            for line in lines:
+                record = json.loads(line)
+                if record['op'] == "add":
+                    self.id_to_row[record['id']] = len(self.ids)
+                    self.ids.append(record['id'])
+                    self.payloads.append(record['payload'])
+                elif record['op'] == "set" and record['id'] in self.id_to_row:
+                    self.payloads[self.id_to_row[record['id']]].update(record['payload'])
+
+            rows = len(self.ids)
+            for name, dim in self.dense_dims.items():
+                self._dense[name] = np.memmap(self._path(f"{name}.bin"), dtype=self.dtype, mode='r', shape=(rows, dim)) \
+                    if rows else np.zeros((0, dim), dtype=self.dtype)
+
+            for name in self.sparse_names:
+                sparse_lines, offset = self._read_lines(self._path(f"{name}.sparse.jsonl"), self._sparse_offsets[name])
+                consumed = 0
+                for sparse_line in sparse_lines:
+                    if self._sparse_rows[name] >= rows:
+                        break
+                    row = self._sparse_rows[name]
+                    indices, values = json.loads(sparse_line)
+                    postings = self._postings[name]
+                    for term, value in zip(indices, values):
+                        term_rows, term_values = postings.setdefault(term, ([], []))
+                        term_rows.append(row)
+                        term_values.append(value)
+                        self._compiled[name].pop(term, None)
+                    self._sparse_rows[name] += 1
+                    consumed += len(sparse_line.encode('utf-8')) + 1
+                self._sparse_offsets[name] += consumed
+
+    def _truncate_to(self, rows: int) -> None:
+        '''обрезка хвостов после прерванной записи, чтобы строки векторов совпадали с журналом'''
+        for name, dim in self.dense_dims.items():
+            path = self._path(f"{name}.bin")
+            size = rows * dim * self.dtype.itemsize
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        for name in self.sparse_names:
+            path = self._path(f"{name}.sparse.jsonl")
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                lines = f.read().split(b'\n')
+            if len(lines) - 1 > rows or (lines and lines[-1]):
+                with open(path, 'wb') as f:
+                    f.write(b''.join(line + b'\n' for line in lines[:rows]))
+
+    def _write_locked(self, write) -> None:
+        '''запись под блокировкой (потоки этого процесса и другие процессы)'''
+        with self._lock, open(self._path(".lock"), 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                write()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self.refresh()
+
+    def _append_log(self, record: Dict[str, Any]) -> None:
+        with open(self._path("points.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add(self, point_id: str, dense: Dict[str, np.ndarray], payload: Dict[str, Any],
+            sparse: Optional[Dict[str, Tuple[List[int], List[float]]]] = None) -> None:
+        '''
+        добавление точки; dense-векторы нормализуются (как при метрике Cosine в Qdrant)
+        параметры:
+            point_id: ID точки
+            dense: векторы по именам
+            payload: payload точки
+            sparse: sparse-векторы по именам: (индексы, веса)
+        '''
+        def write():
+            rows = len(self.ids)
+            self._truncate_to(rows)
+            for name in self.dense_dims:
+                vector = np.asarray(dense[name], dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vector = vector / norm if norm else vector
+                with open(self._path(f"{name}.bin"), 'ab') as f:
+                    f.write(vector.astype(self.dtype).tobytes())
+            for name in self.sparse_names:
+                indices, values = (sparse or {}).get(name, ([], []))
+                with open(self._path(f"{name}.sparse.jsonl"), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps([[int(i) for i in indices], [float(v) for v in values]]) + "\n")
+            self._append_log({"op": "add", "id": point_id, "payload": payload})
+
+        self._write_locked(write)
+
+    def set_payload(self, point_id: str, payload: Dict[str, Any]) -> None:
+        '''обновление полей payload точки'''
+        self._write_locked(lambda: self._append_log({"op": "set", "id": point_id, "payload": payload}))
+
+    def payload_column(self, field: str, numeric: bool = False) -> np.ndarray:
+        '''
+        значения поля payload по всем строкам, кэшируются до следующих изменений
+        параметры:
+            numeric: float64 с NaN для точек без поля (иначе - объекты с None)
+        '''
+        with self._lock:
+            key = (field, numeric)
+            if key not in self._columns:
+                values = [payload.get(field) for payload in self.payloads]
+                if numeric:
+                    column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+                else:
+                    column = np.empty(len(values), dtype=object)
+                    column[:] = values
+                self._columns[key] = column
+            return self._columns[key]
+
+    def dense_scores(self, name: str, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        '''косинусная близость запроса ко всем точкам (или только к строкам rows)'''
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+        matrix = self._dense[name] if rows is None else self._dense[name][rows]
+        if self.dtype == np.float32:
+            return matrix @ query
+        # float16 считаем блоками в float32: у numpy нет BLAS для float16
+        block = 16384
+        return np.concatenate([
+            matrix[start:start + block].astype(np.float32) @ query
+            for start in range(0, len(matrix), block)
+        ]) if len(matrix) else np.zeros(0, dtype=np.float32)
+
+    def sparse_scores(self, name: str, indices, values) -> Tuple[np.ndarray, np.ndarray]:
+        '''скалярное произведение sparse-запроса с точками по инвертированному индексу: (строки, оценки)'''
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        touched = np.zeros(len(self.ids), dtype=bool)
+        postings, compiled = self._postings[name], self._compiled[name]
+        for term, query_value in zip(indices, values):
+            term = int(term)
+            if term not in postings:
+                continue
+            if term not in compiled:
+                term_rows, term_values = postings[term]
+                compiled[term] = (np.asarray(term_rows, dtype=np.int64), np.asarray(term_values, dtype=np.float32))
+            term_rows, term_values = compiled[term]
+            scores[term_rows] += term_values * float(query_value)
+            touched[term_rows] = True
+        rows = np.flatnonzero(touched)
+        return rows, scores[rows]
+
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    '''строки с k наибольшими оценками по убыванию'''
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[part], scores[part]
+    return rows[np.argsort(-scores, kind='stable')]
+
+
+class NumpyIndexManager(QdrantManager):
+    '''
+    встроенный поиск без сервера Qdrant для небольших каталогов и офлайн-демо:
+    векторы в memory-mapped файлах, sparse - в инвертированном индексе в памяти,
+    точный top-k и слияние RRF как в hybrid_search_dbsf
+    '''
+
+    def __init__(self, index_dir: Optional[str] = None):
+        '''
+        параметры:
+            index_dir: директория индекса (по умолчанию config.NUMPY_INDEX_DIR)
+        '''
+        self.collection_name = config.QDRANT_COLLECTION
+        self.index_dir = index_dir or config.NUMPY_INDEX_DIR
+        self.client = None
+        self.mode = "numpy"
+        self.degraded = False
+        self.degraded_reason = None
+        self._pinned = False
+        self.version = self._current_version()
+        self.videos, self.semantic_cache = self._open_version(self.version)
+        print(f"Используется встроенный индекс NumPy в {self.index_dir} ({len(self.videos)} видео)")
+
+    def _current_version(self) -> str:
+        '''
+        текущая версия индекса из файла CURRENT (его атомарно подменяет finish_rebuild);
+        без файла - директория config.QDRANT_COLLECTION, как до появления пересборки
+        '''
+        try:
+            with open(os.path.join(self.index_dir, "CURRENT"), encoding='utf-8') as f:
+                return f.read().strip() or self.collection_name
+        except FileNotFoundError:
+            return self.collection_name
+
+    def _open_version(self, version: str) -> Tuple[_PointStore, _PointStore]:
+        '''хранилища видео и семантического кэша версии (кэш каждой версии свой: в нем ID ее точек)'''
+        directory = os.path.join(self.index_dir, version)
+        if version == self.collection_name:
+            cache_directory = os.path.join(self.index_dir, "semantic_cache_queries")
+        else:
+            cache_directory = os.path.join(directory, "semantic_cache")
+        videos = _PointStore(
+            directory,
+            dense={"visual": config.VISUAL_VECTOR_SIZE, "text_dense": config.TEXT_VECTOR_SIZE},
+            sparse=["text_sparse"],
+            dtype=config.NUMPY_INDEX_DTYPE
+        )
+        semantic_cache = _PointStore(
+            cache_directory,
+            dense={"text_dense_vector": config.TEXT_VECTOR_SIZE},
+            dtype=config.NUMPY_INDEX_DTYPE
+        )
+        return videos, semantic_cache
+
+    def _sync_version(self) -> None:
+        '''переход на новую версию, если пересборка (в том числе в другом процессе) ее переключила'''
+        if self._pinned:
+            return
+        version = self._current_version()
+        if version != self.version:
+            self.version = version
+            self.videos, self.semantic_cache = self._open_version(version)
+
+    def index_generation(self) -> str:
+        '''поколение индекса: версия и позиция в журнале точек'''
+        self._sync_version()
+        self.videos.refresh()
+        return f"{self.version}:{len(self.videos)}:{self.videos._log_offset}"
+
+    def count_videos(self) -> int:
+        self.videos.refresh()
+        return len(self.videos)
+
+    def begin_rebuild(self) -> "NumpyIndexManager":
+        '''
+        начало полной пересборки в новую версию (директорию); файлы версий только дописываются,
+        поэтому старые точки в новую не попадают и дубликаты не копятся
+        вывод: менеджер новой версии, этот менеджер до finish_rebuild работает со старой
+        '''
+        rebuild = copy.copy(self)
+        rebuild.version = self._new_version_name()
+        rebuild._pinned = True
+        rebuild.videos, rebuild.semantic_cache = self._open_version(rebuild.version)
+        print(f"Пересборка встроенного индекса NumPy в '{rebuild.version}'")
+        return rebuild
+
+    def finish_rebuild(self, rebuild: "NumpyIndexManager"):
+        '''переключение CURRENT на новую версию (читатели в других процессах перейдут при следующем запросе) и удаление старой'''
+        if rebuild.count_videos() == 0:
+            raise RuntimeError(f"Версия '{rebuild.version}' пуста, индекс не переключается")
+        old_version = self._current_version()
+        temp_path = os.path.join(self.index_dir, f"CURRENT.tmp_{uuid.uuid4().hex}")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(rebuild.version)
+        os.replace(temp_path, os.path.join(self.index_dir, "CURRENT"))
+        self._sync_version()
+        print(f"Индекс NumPy переключен на '{rebuild.version}'")
+
+        # открытые memmap старой версии в других процессах остаются читаемыми и после удаления файлов
+        if old_version != rebuild.version:
+            shutil.rmtree(os.path.join(self.index_dir, old_version), ignore_errors=True)
+            if old_version == self.collection_name:
+                shutil.rmtree(os.path.join(self.index_dir, "semantic_cache_queries"), ignore_errors=True)
+            print(f"Старая версия '{old_version}' удалена")
+
+    def abort_rebuild(self, rebuild: "NumpyIndexManager"):
+        '''отмена пересборки: директория новой версии удаляется'''
+        if rebuild.version != self._current_version():
+            shutil.rmtree(os.path.join(self.index_dir, rebuild.version), ignore_errors=True)
+            print(f"Пересборка отменена, версия '{rebuild.version}' удалена")
+
+    def index_video(self, video_path: str,
+                    visual_embeds: np.ndarray,
+                    text_dense_embeds: np.ndarray,
+                    text_sparse_embeds,
+                    metadata: Dict[str, Any]) -> str:
+        '''индексирование видео (3 типа эмбеддингов), параметры как у QdrantManager.index_video'''
+        try:
+            self._sync_version()
+            point_id = str(uuid.uuid4())
+            metadata.update({
+                "video_path": self.normalize_video_path(video_path),
+                "video_name": os.path.basename(video_path)
+            })
+            self.videos.add(
+                point_id,
+                dense={"visual": visual_embeds, "text_dense": text_dense_embeds},
+                sparse={"text_sparse": (list(text_sparse_embeds.indices), list(text_sparse_embeds.values))},
+                payload=metadata
+            )
+            return point_id
+        except Exception as e:
+            print(f"Ошибка при индексации видео {video_path} в индекс NumPy: {str(e)}")
+            raise
+
+    def get_indexed_video_paths(self) -> set:
+        self._sync_version()
+        self.videos.refresh()
+        indexed_paths = set()
+        for payload in self.videos.payloads:
+            if 'video_path' in payload:
+                indexed_paths.add(os.path.normpath(payload['video_path']))
+            indexed_paths.update(os.path.normpath(path) for path in payload.get('duplicates') or [])
+        return indexed_paths
+
+    def find_duplicate(self, fingerprint: List[str], duration: float, video_path: str) -> Optional[Dict[str, Any]]:
+        if not fingerprint:
+            return None
+        self._sync_version()
+        self.videos.refresh()
+        own_path = self.normalize_video_path(video_path)
+        for point_id, payload in zip(self.videos.ids, self.videos.payloads):
+            if abs(payload.get('duration', -1e9) - duration) > config.DUPLICATE_DURATION_TOLERANCE:
+                continue
+            if os.path.normpath(payload.get('video_path', '')) == own_path:
+                continue
+            if self._fingerprints_match(fingerprint, payload.get('fingerprint') or []):
+                return {"id": point_id, "video_path": payload.get('video_path')}
+        return None
+
+    def link_duplicate(self, point_id: str, video_path: str) -> None:
+        self._sync_version()
+        self.videos.refresh()
+        payload = self.videos.payloads[self.videos.id_to_row[point_id]]
+        duplicates = list(payload.get('duplicates', []))
+        normalized_path = self.normalize_video_path(video_path)
+        if normalized_path not in duplicates:
+            duplicates.append(normalized_path)
+        self.videos.set_payload(point_id, {"duplicates": duplicates})
+
+    def upsert_semantic_cache(self, query_text: str, query_vector: List[float], metadata: List[Dict[str, Any]]):
+        try:
+            self._sync_version()
+            self.semantic_cache.add(
+                str(uuid.uuid4()),
+                dense={"text_dense_vector": query_vector},
+                payload={"query_text": query_text, "metadata": metadata}
+            )
+        except Exception as e:
+            print(f"Ошибка при семантическом кэшировании: {str(e)}")
+            return []
+
+    def semantic_search(self, query_vector: np.ndarray):
+        '''ближайший запрос из семантического кэша (в формате ответа Qdrant)'''
+        self._sync_version()
+        self.semantic_cache.refresh()
+        if not len(self.semantic_cache):
+            return []
+        scores = self.semantic_cache.dense_scores("text_dense_vector", query_vector)
+        row = int(np.argmax(scores))
+        return [ScoredPoint(id=self.semantic_cache.ids[row], version=0, score=float(scores[row]),
+                            payload=self.semantic_cache.payloads[row])]
+
+    def _filter_rows(self, filters: Dict[str, Any]) -> np.ndarray:
+        '''строки, подходящие под фильтры поиска (уже проверенные normalize_filters)'''
+        mask = np.ones(len(self.videos), dtype=bool)
+        for field_name, condition in filters.items():
+            if PAYLOAD_INDEXES[field_name] == PayloadSchemaType.KEYWORD:
+                mask &= np.isin(self.videos.payload_column(field_name), list(condition))
+                continue
+            # у точек без поля NaN: любое сравнение с ним ложно, как и в Qdrant
+            values = self.videos.payload_column(field_name, numeric=True)
+            for op, compare in (("gt", np.greater), ("gte", np.greater_equal), ("lt", np.less), ("lte", np.less_equal)):
+                if condition.get(op) is not None:
+                    mask &= compare(values, condition[op])
+        return np.flatnonzero(mask)
+
+    def hybrid_search_dbsf(self, query_text: str,
+                           visual_vector: Optional[np.ndarray] = None,
+                           text_dense_vector: Optional[np.ndarray] = None,
+                           text_sparse_vector: Optional[np.ndarray] = None,
+                           limit: int = config.SEARCH_LIMIT,
+                           filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        '''мультимодальный поиск: точный top-k по каждому вектору (limit*2) и слияние RRF, как в QdrantManager'''
+        try:
+            self._sync_version()
+            self.videos.refresh()
+            if not len(self.videos):
+                return []
+
+            prefetch_limit = limit * 2
+            filters = self.normalize_filters(filters)
+            sparse_rows, sparse_scores = self.videos.sparse_scores(
+                "text_sparse", text_sparse_vector.indices, text_sparse_vector.values
+            )
+            if filters:
+                # плотные векторы считаем только для подходящих строк, как Prefetch с фильтром в Qdrant
+                rows = self._filter_rows(filters)
+                if not len(rows):
+                    return []
+                keep = np.isin(sparse_rows, rows)
+                sparse_rows, sparse_scores = sparse_rows[keep], sparse_scores[keep]
+                dense_rows = rows
+            else:
+                rows, dense_rows = np.arange(len(self.videos)), None
+            rankings = [
+                _top_k(rows, self.videos.dense_scores("visual", visual_vector, dense_rows), prefetch_limit),
+                _top_k(rows, self.videos.dense_scores("text_dense", text_dense_vector, dense_rows), prefetch_limit),
+                _top_k(sparse_rows, sparse_scores, prefetch_limit),
+            ]
+
+            fused: Dict[int, float] = {}
+            for ranking in rankings:
+                for position, row in enumerate(ranking):
+                    fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (position + config.RRF_K)
+
+            best = sorted(fused.items(), key=lambda item: -item[1])[:limit]
+            return [
+                self._search_result(self.videos.ids[row], score, self.videos.payloads[row], query_text)
+                for row, score in best
+            ]
+        except Exception as e:
+            print(f"Ошибка при выполнении гибридного поиска: {str(e)}")
+            return []
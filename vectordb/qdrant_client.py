@@ -1,5 +1,8 @@
+import copy
 import os
 import uuid
+import urllib.error
+import urllib.request
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 from qdrant_client import QdrantClient
@@ -11,84 +14,381 @@ from qdrant_client.models import (
     SparseVectorParams,
     Prefetch,
     FusionQuery,
-    Fusion
+    Fusion,
+    Filter,
+    FieldCondition,
+    Range,
+    MatchAny,
+    PayloadSchemaType,
+    HnswConfigDiff,
+    OptimizersConfigDiff,
+    CollectionStatus,
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation
 )
 import config
 import time
 
+# payload-поля с индексами: по ним работают фильтры поиска (и отбор кандидатов в дубликаты по duration)
+PAYLOAD_INDEXES = {
+    "duration": PayloadSchemaType.FLOAT,
+    "width": PayloadSchemaType.INTEGER,
+    "height": PayloadSchemaType.INTEGER,
+    "fps": PayloadSchemaType.FLOAT,
+    "language": PayloadSchemaType.KEYWORD,
+    "file_size": PayloadSchemaType.INTEGER,
+    "ingested_at": PayloadSchemaType.INTEGER,
+}
+
+
 class QdrantManager:
-    def __init__(self, max_retries=3, retry_delay=2):
+    def __init__(self, max_retries: Optional[int] = None, retry_delay: Optional[float] = None,
+                 client: Optional[QdrantClient] = None):
         '''
         инициализация клиента qdrant и создание коллекции если не существует
+        режим задается config.QDRANT_MODE; если сервер недоступен, менеджер переходит
+        в резервный режим config.QDRANT_FALLBACK и помечается как degraded
         параметры:
-            max_retries: макс кол-во попыток подключения
-            retry_delay: задержка между попытками подключения (сек.)
+            max_retries: макс кол-во проверок доступности сервера (по умолчанию config.QDRANT_CONNECT_ATTEMPTS)
+            retry_delay: начальная пауза между проверками, удваивается с каждой попыткой (сек.)
+            client: готовый клиент (например, QdrantClient(path=...) для бенчмарков), подключение не выполняется
         '''
-        self.max_retries = max_retries
-        self.retry_delay = retry_delay
+        self.max_retries = max_retries or config.QDRANT_CONNECT_ATTEMPTS
+        self.retry_delay = retry_delay or config.QDRANT_BACKOFF_BASE
         self.collection_name = config.QDRANT_COLLECTION
+        self.degraded = False
+        self.degraded_reason = None
+        # поколение индекса для кэша страниц API: счетчик записей этого менеджера
+        # и состояние коллекции, перечитываемое не чаще раза в config.SEARCH_GENERATION_TTL
+        self._generation = 0
+        self._generation_state = None
+        self._generation_checked = 0.0
+        
+        if client is not None:
+            self.mode = "custom"
+            self.client = client
+            self._initialize_collections()
+            return
+        
+        started = time.perf_counter()
+        self.mode = config.QDRANT_MODE
+        if self.mode == "remote":
+            if self._wait_for_server():
+                self.client = QdrantClient(
+                    host=config.QDRANT_HOST,
+                    port=config.QDRANT_PORT,
+                    grpc_port=config.QDRANT_GRPC_PORT,
+                    prefer_grpc=config.QDRANT_PREFER_GRPC,
+                    timeout=config.QDRANT_TIMEOUT
+                )
+            else:
+                self._use_fallback(f"сервер {config.QDRANT_HOST}:{config.QDRANT_PORT} недоступен")
+        elif self.mode == "local":
+            self.client = QdrantClient(path=config.QDRANT_PATH)
+        elif self.mode == "memory":
+            self.client = QdrantClient(":memory:")
+        else:
+            raise ValueError(f"Неизвестный режим Qdrant: {self.mode}")
         
-        for attempt in range(1, max_retries + 1):
+        self._initialize_collections()
+        print(f"Qdrant ({self.mode}) готов за {(time.perf_counter() - started) * 1000:.0f} мс")
+    
+    def _wait_for_server(self) -> bool:
+        '''
+        быстрая проверка доступности сервера (/readyz) с экспоненциальной паузой между попытками
+        возвращает:
+            True если сервер ответил
+        '''
+        url = f"http://{config.QDRANT_HOST}:{config.QDRANT_PORT}/readyz"
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
             try:
-                if attempt == max_retries:
-                    print("Используем встроенную версию Qdrant в памяти")
-                    self.client = QdrantClient(":memory:")
-                else:
-                    self.client = QdrantClient(host=config.QDRANT_HOST, port=config.QDRANT_PORT)
-                
-                # инициализируем коллекцию
-                self._initialize_collections()
-                print(f"Подключение к Qdrant успешно установлено с {attempt}/{max_retries} попыток")
-                break
+                with urllib.request.urlopen(url, timeout=config.QDRANT_PROBE_TIMEOUT):
+                    return True
+            except urllib.error.HTTPError as e:
+                # старые версии Qdrant без /readyz отвечают 404, но сервер при этом работает
+                if e.code == 404:
+                    return True
+            except (urllib.error.URLError, OSError):
+                pass
+            if attempt < self.max_retries:
+                time.sleep(delay)
+                delay = min(delay * 2, config.QDRANT_BACKOFF_MAX)
+        return False
+    
+    def _use_fallback(self, reason: str):
+        '''
+        переход в резервный режим config.QDRANT_FALLBACK, о котором сообщается в логах, /health и метриках
+        параметры:
+            reason: причина перехода
+        '''
+        if config.QDRANT_FALLBACK == "none":
+            raise RuntimeError(f"Qdrant: {reason}, резервный режим отключен (QDRANT_FALLBACK=none)")
+        
+        self.degraded = True
+        self.degraded_reason = reason
+        if config.QDRANT_FALLBACK == "local":
+            try:
+                self.client = QdrantClient(path=config.QDRANT_PATH)
+                self.mode = "local"
             except Exception as e:
-                if attempt < max_retries:
-                    time.sleep(retry_delay)
-                else:
-                    print(f"Не удалось подключиться к Qdrant после {max_retries} попыток, используем встроенную версию")
-                    self.client = QdrantClient(":memory:")
-                    self._initialize_collections()
+                # папку уже занял другой процесс (встроенный Qdrant не делится между процессами)
+                self.degraded_reason = f"{reason}; {config.QDRANT_PATH} недоступна: {e}"
+                self.client = QdrantClient(":memory:")
+                self.mode = "memory"
+        else:
+            self.client = QdrantClient(":memory:")
+            self.mode = "memory"
+        
+        print("!" * 60)
+        print(f"ВНИМАНИЕ: Qdrant работает в резервном режиме '{self.mode}': {self.degraded_reason}")
+        if self.mode == "memory":
+            print("Проиндексированные в этом режиме данные будут потеряны при перезапуске")
+        print("!" * 60)
+    
+    def status(self) -> Dict[str, Any]:
+        '''состояние подключения к векторной БД для /health'''
+        return {"backend": self.mode, "degraded": self.degraded, "reason": self.degraded_reason}
     
     def _initialize_collections(self):
-        '''инициализация коллекций'''
+        '''
+        инициализация коллекций: поиск идет через алиас config.QDRANT_COLLECTION,
+        за которым стоит версионированная коллекция (ее можно пересобрать и подменить без простоя)
+        '''
         try:
             collections = self.client.get_collections().collections
             collection_names = [c.name for c in collections]
             
-            if self.collection_name not in collection_names:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config={
-                        "visual": VectorParams(
-                            size=config.VISUAL_VECTOR_SIZE,
-                            distance=Distance.COSINE
-                        ),
-                        "text_dense": VectorParams(
-                            size=config.TEXT_VECTOR_SIZE,
-                            distance=Distance.COSINE
-                        )
-                    },
-                    sparse_vectors_config={
-                        "text_sparse": SparseVectorParams(),
-                    }
-                )
-            
-            if 'semantic_cache_queries' not in collection_names:
-                self.client.create_collection(
-                    collection_name='semantic_cache_queries',
-                    vectors_config={
-                        "text_dense_vector": VectorParams(
-                            size=1024,
-                            distance="Cosine")
-                    }
-                )
-
-                print(f"Коллекция '{self.collection_name}' успешно создана")
+            if self._alias_target() is None and self.collection_name not in collection_names:
+                version_name = self._new_version_name()
+                self._create_video_collection(version_name)
+                self.client.update_collection_aliases(change_aliases_operations=[
+                    CreateAliasOperation(create_alias=CreateAlias(
+                        collection_name=version_name,
+                        alias_name=self.collection_name
+                    ))
+                ])
+                print(f"Коллекция '{version_name}' успешно создана (алиас '{self.collection_name}')")
             else:
                 print(f"Используется существующая коллекция '{self.collection_name}'")
+            
+            self._ensure_payload_indexes()
+            
+            if 'semantic_cache_queries' not in collection_names:
+                self._create_semantic_cache_collection()
         except Exception as e:
             print(f"Ошибка при инициализации коллекции: {str(e)}")
             raise
     
+    def _create_video_collection(self, collection_name: str, bulk_load: bool = False):
+        '''
+        создание коллекции видео
+        параметры:
+            collection_name: имя коллекции
+            bulk_load: отложить построение HNSW до конца массовой загрузки (см. finish_rebuild)
+        '''
+        self.client.create_collection(
+            collection_name=collection_name,
+            vectors_config={
+                "visual": VectorParams(
+                    size=config.VISUAL_VECTOR_SIZE,
+                    distance=Distance.COSINE
+                ),
+                "text_dense": VectorParams(
+                    size=config.TEXT_VECTOR_SIZE,
+                    distance=Distance.COSINE
+                )
+            },
+            sparse_vectors_config={
+                "text_sparse": SparseVectorParams(),
+            },
+            hnsw_config=HnswConfigDiff(m=0) if bulk_load else None,
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=0) if bulk_load else None
+        )
+    
+    def _create_semantic_cache_collection(self):
+        self.client.create_collection(
+            collection_name='semantic_cache_queries',
+            vectors_config={
+                "text_dense_vector": VectorParams(
+                    size=config.TEXT_VECTOR_SIZE,
+                    distance="Cosine")
+            }
+        )
+        print("Коллекция 'semantic_cache_queries' успешно создана")
+    
+    def _new_version_name(self) -> str:
+        '''имя новой версии коллекции видео: video_search_v20240101_120000_123'''
+        now = time.time()
+        return f"{config.QDRANT_COLLECTION}_v{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}_{int(now * 1000) % 1000:03d}"
+    
+    def _alias_target(self) -> Optional[str]:
+        '''коллекция, на которую указывает алиас config.QDRANT_COLLECTION (None - алиаса нет)'''
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == config.QDRANT_COLLECTION:
+                return alias.collection_name
+        return None
+    
+    def begin_rebuild(self) -> "QdrantManager":
+        '''
+        начало полной пересборки: новая версия коллекции с отложенной индексацией HNSW
+        вывод: менеджер новой версии - записи через него (index_video, поиск дубликатов) идут в нее,
+            а этот менеджер, поиск и другие задания до finish_rebuild работают со старой
+        '''
+        version_name = self._new_version_name()
+        self._create_video_collection(version_name, bulk_load=True)
+        rebuild = copy.copy(self)
+        rebuild.collection_name = version_name
+        rebuild._ensure_payload_indexes()
+        print(f"Пересборка индекса в новую коллекцию '{version_name}'")
+        return rebuild
+    
+    def count_videos(self) -> int:
+        '''количество точек в коллекции менеджера'''
+        return self.client.count(collection_name=self.collection_name, exact=True).count
+    
+    def finish_rebuild(self, rebuild: "QdrantManager"):
+        '''
+        завершение пересборки: включение HNSW, ожидание окончания оптимизации,
+        атомарное переключение алиаса, удаление старой версии и сброс семантического кэша
+        параметры:
+            rebuild: менеджер новой версии из begin_rebuild
+        '''
+        version_name = rebuild.collection_name
+        if rebuild.count_videos() == 0:
+            raise RuntimeError(f"Коллекция '{version_name}' пуста, алиас не переключается")
+        
+        started = time.perf_counter()
+        self.client.update_collection(
+            collection_name=version_name,
+            hnsw_config=HnswConfigDiff(m=config.QDRANT_HNSW_M),
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=config.QDRANT_INDEXING_THRESHOLD)
+        )
+        self._wait_for_green(version_name)
+        print(f"Индекс HNSW построен за {time.perf_counter() - started:.1f} с")
+        
+        self.activate_version(version_name)
+        
+        # закэшированные выдачи ссылаются на точки старой версии
+        self.client.delete_collection('semantic_cache_queries')
+        self._create_semantic_cache_collection()
+    
+    def activate_version(self, version_name: str):
+        '''
+        атомарное переключение алиаса config.QDRANT_COLLECTION на готовую версию коллекции
+        и удаление предыдущей версии
+        параметры:
+            version_name: имя версии (после пересборки или восстановления из снапшота)
+        '''
+        alias_name = config.QDRANT_COLLECTION
+        old_name = self._alias_target()
+        if old_name is None and self.client.collection_exists(alias_name):
+            # миграция со старой схемы без алиасов: имя занято самой коллекцией,
+            # поэтому ее приходится удалить до создания алиаса (поиск недоступен на время одного запроса)
+            self.client.delete_collection(alias_name)
+            print(f"Коллекция '{alias_name}' без алиаса удалена, далее пересборки идут без простоя")
+        
+        operations = [CreateAliasOperation(create_alias=CreateAlias(collection_name=version_name, alias_name=alias_name))]
+        if old_name is not None:
+            operations.insert(0, DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias_name)))
+        self.client.update_collection_aliases(change_aliases_operations=operations)
+        self.collection_name = alias_name
+        self._generation += 1
+        print(f"Алиас '{alias_name}' переключен на '{version_name}'")
+        
+        if old_name is not None and old_name != version_name:
+            self.client.delete_collection(old_name)
+            print(f"Старая версия '{old_name}' удалена")
+    
+    def abort_rebuild(self, rebuild: "QdrantManager"):
+        '''
+        отмена пересборки: новая версия удаляется, поиск продолжает работать по старой
+        параметры:
+            rebuild: менеджер новой версии из begin_rebuild
+        '''
+        version_name = rebuild.collection_name
+        # если finish_rebuild успел переключить алиас, версия уже рабочая и не удаляется
+        if version_name not in (config.QDRANT_COLLECTION, self._alias_target()):
+            self.client.delete_collection(version_name)
+            print(f"Пересборка отменена, коллекция '{version_name}' удалена")
+    
+    def index_generation(self) -> str:
+        '''
+        поколение индекса для кэша страниц: записи и переключения версий через этот менеджер меняют его сразу,
+        а версия и число точек (записи воркера в другом процессе) перечитываются из Qdrant
+        не чаще раза в config.SEARCH_GENERATION_TTL секунд, а не на каждый запрос поиска
+        '''
+        now = time.monotonic()
+        if self._generation_state is None or now - self._generation_checked >= config.SEARCH_GENERATION_TTL:
+            target = self._alias_target() or self.collection_name
+            count = self.client.count(collection_name=self.collection_name, exact=False).count
+            self._generation_state = f"{target}:{count}"
+            self._generation_checked = now
+        return f"{self._generation_state}:{self._generation}"
+    
+    def _wait_for_green(self, collection_name: str):
+        '''ожидание окончания оптимизации коллекции (статус green)'''
+        deadline = time.monotonic() + config.QDRANT_OPTIMIZE_TIMEOUT
+        while self.client.get_collection(collection_name).status != CollectionStatus.GREEN:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Коллекция '{collection_name}' не завершила оптимизацию "
+                                   f"за {config.QDRANT_OPTIMIZE_TIMEOUT} с")
+            time.sleep(1)
+    
+    def _ensure_payload_indexes(self):
+        '''создание payload-индексов (повторный вызов для существующего индекса ничего не меняет)'''
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=field_name,
+                field_schema=field_schema
+            )
+    
+    def normalize_filters(self, filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        '''
+        проверка фильтров поиска до запроса: неизвестное поле - ValueError, пустые условия
+        (language: [] или диапазон без границ) отбрасываются, а не превращаются в условие, которому ничего не подходит
+        параметры:
+            filters: {"duration": {"gte": 10, "lte": 60}, "language": ["ru", "en"], ...}, поля из PAYLOAD_INDEXES
+        вывод: фильтры без пустых условий (None - фильтровать нечего)
+        '''
+        if not filters:
+            return None
+        normalized = {}
+        for field_name, condition in filters.items():
+            if field_name not in PAYLOAD_INDEXES:
+                raise ValueError(f"Фильтр по полю {field_name} не поддерживается")
+            if PAYLOAD_INDEXES[field_name] == PayloadSchemaType.KEYWORD:
+                if not isinstance(condition, (list, tuple, set)):
+                    raise ValueError(f"Фильтр по полю {field_name} должен быть списком значений")
+                condition = list(condition)
+            else:
+                if not isinstance(condition, dict) or set(condition) - {"gt", "gte", "lt", "lte"}:
+                    raise ValueError(f"Фильтр по полю {field_name} должен быть диапазоном (gt, gte, lt, lte)")
+                condition = {op: value for op, value in condition.items() if value is not None}
+            if condition:
+                normalized[field_name] = condition
+        return normalized or None
+
+    def _build_filter(self, filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        '''
+        фильтр Qdrant из фильтров поиска
+        параметры:
+            filters: фильтры поиска (см. normalize_filters)
+        '''
+        filters = self.normalize_filters(filters)
+        if not filters:
+            return None
+        conditions = []
+        for field_name, condition in filters.items():
+            if PAYLOAD_INDEXES[field_name] == PayloadSchemaType.KEYWORD:
+                conditions.append(FieldCondition(key=field_name, match=MatchAny(any=list(condition))))
+            else:
+                conditions.append(FieldCondition(key=field_name, range=Range(**condition)))
+        return Filter(must=conditions)
+    
     def index_video(self, video_path: str,
                     visual_embeds: np.ndarray,
                     text_dense_embeds: np.ndarray,
@@ -108,16 +408,8 @@ class QdrantManager:
             point_id = str(uuid.uuid4())
             video_name = os.path.basename(video_path)
             
-            if not video_path.startswith('/app/'):
-                if os.path.isabs(video_path):
-                    normalized_path = os.path.join('/app', os.path.basename(video_path))
-                else:
-                    normalized_path = os.path.join('/app', video_path)
-            else:
-                normalized_path = video_path
-            
             metadata.update({
-                "video_path": normalized_path,
+                "video_path": self.normalize_video_path(video_path),
                 "video_name": video_name
             })
             
@@ -138,12 +430,144 @@ class QdrantManager:
                     )
                 ]
             )
+            self._generation += 1
             
             return point_id
         except Exception as e:
             print(f"Ошибка при индексации видео {video_path} в Qdrant: {str(e)}")
             raise
     
+    def get_indexed_video_paths(self) -> set:
+        '''пути всех проиндексированных видео (включая привязанные дубликаты), приведенные через normalize_video_path'''
+        indexed_paths = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1000,
+                offset=offset,
+                with_payload=["video_path", "duplicates"],
+                with_vectors=False
+            )
+            for point in points:
+                if 'video_path' in point.payload:
+                    indexed_paths.add(os.path.normpath(point.payload['video_path']))
+                indexed_paths.update(os.path.normpath(path) for path in point.payload.get('duplicates') or [])
+            if offset is None:
+                return indexed_paths
+
+    def normalize_video_path(self, video_path: str) -> str:
+        '''путь к видео в том виде, в котором он хранится в payload (внутри контейнера /app)'''
+        if video_path.startswith('/app/'):
+            return os.path.normpath(video_path)
+        if os.path.isabs(video_path):
+            return os.path.join('/app', os.path.basename(video_path))
+        return os.path.normpath(os.path.join('/app', video_path))
+
+    def find_duplicate(self, fingerprint: List[str], duration: float, video_path: str) -> Optional[Dict[str, Any]]:
+        '''
+        поиск уже проиндексированного видео-дубликата по отпечатку кадров и длительности аудио
+        параметры:
+            fingerprint: dHash кадров видео (hex)
+            duration: длительность аудио в секундах
+            video_path: путь к проверяемому видео (его собственная точка дубликатом не считается)
+        вывод: {'id', 'video_path'} найденного оригинала или None
+        '''
+        if not fingerprint:
+            return None
+
+        try:
+            own_path = self.normalize_video_path(video_path)
+            duration_filter = Filter(must=[
+                FieldCondition(
+                    key="duration",
+                    range=Range(
+                        gte=duration - config.DUPLICATE_DURATION_TOLERANCE,
+                        lte=duration + config.DUPLICATE_DURATION_TOLERANCE
+                    )
+                )
+            ])
+
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=duration_filter,
+                    limit=256,
+                    offset=offset,
+                    with_payload=["fingerprint", "video_path"],
+                    with_vectors=False
+                )
+                for point in points:
+                    if os.path.normpath(point.payload.get('video_path', '')) == own_path:
+                        continue
+                    if self._fingerprints_match(fingerprint, point.payload.get('fingerprint') or []):
+                        return {"id": point.id, "video_path": point.payload.get('video_path')}
+                if offset is None:
+                    return None
+        except Exception as e:
+            print(f"Ошибка при поиске дубликатов в Qdrant: {str(e)}")
+            return None
+
+    def _fingerprints_match(self, first: List[str], second: List[str]) -> bool:
+        '''
+        сравнение отпечатков: для каждого кадра ищем ближайший кадр другого видео,
+        так сравнение не зависит от того, какие именно кадры отобрал FrameSelector
+        '''
+        if not first or not second:
+            return False
+        # у статичного или черного видео все кадры почти одинаковы, такой отпечаток совпадет
+        # с любым похожим роликом той же длины - он индексируется как обычное видео
+        if min(self._distinct_frames(first), self._distinct_frames(second)) < config.DUPLICATE_MIN_DISTINCT_FRAMES:
+            return False
+        if min(len(first), len(second)) / max(len(first), len(second)) < config.DUPLICATE_MATCH_RATIO:
+            return False
+
+        second_hashes = [int(h, 16) for h in second]
+        matched = sum(
+            1 for a in first
+            if min(bin(int(a, 16) ^ b).count('1') for b in second_hashes) <= config.DUPLICATE_HASH_DISTANCE
+        )
+        return matched / len(first) >= config.DUPLICATE_MATCH_RATIO
+
+    def _distinct_frames(self, fingerprint: List[str]) -> int:
+        '''количество заметно различных кадров отпечатка (дальше config.DUPLICATE_HASH_DISTANCE друг от друга)'''
+        distinct = []
+        for value in (int(h, 16) for h in fingerprint):
+            if all(bin(value ^ other).count('1') > config.DUPLICATE_HASH_DISTANCE for other in distinct):
+                distinct.append(value)
+                if len(distinct) >= config.DUPLICATE_MIN_DISTINCT_FRAMES:
+                    break
+        return len(distinct)
+
+    def link_duplicate(self, point_id: str, video_path: str) -> None:
+        '''
+        привязка дубликата к уже проиндексированному видео вместо повторной индексации
+        параметры:
+            point_id: ID точки оригинала
+            video_path: путь к видео-дубликату
+        '''
+        try:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=[point_id],
+                with_payload=["duplicates"]
+            )
+            duplicates = points[0].payload.get('duplicates', []) if points else []
+            normalized_path = self.normalize_video_path(video_path)
+            if normalized_path not in duplicates:
+                duplicates.append(normalized_path)
+
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload={"duplicates": duplicates},
+                points=[point_id]
+            )
+            self._generation += 1
+        except Exception as e:
+            print(f"Ошибка при привязке дубликата {video_path}: {str(e)}")
+            raise
+
     def upsert_semantic_cache(self, query_text: str, query_vector: List[float], metadata: List[Dict[str, Any]]):
         try:
             point_id = str(uuid.uuid4())
@@ -190,7 +614,8 @@ class QdrantManager:
                            visual_vector: Optional[np.ndarray] = None, 
                            text_dense_vector: Optional[np.ndarray] = None,
                            text_sparse_vector: Optional[np.ndarray] = None,
-                           limit: int = config.SEARCH_LIMIT) -> List[Dict[str, Any]]:
+                           limit: int = config.SEARCH_LIMIT,
+                           filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         '''
         мультимодальный поиск по всем эмбеддингам
         параметры:
@@ -199,10 +624,12 @@ class QdrantManager:
             text_dense_vector: текстовый вектор запроса - dense
             text_sparse_vector: текстовый вектор запроса - sparse
             limit: максимальное количество результатов
+            filters: фильтры по метаданным (см. _build_filter), применяются в каждом Prefetch
         вывод: список найденных видео с объединенной оценкой
         '''
         try:
             results = []
+            query_filter = self._build_filter(filters)
             
             search_result = self.client.query_points(
                 collection_name=self.collection_name,
@@ -210,11 +637,13 @@ class QdrantManager:
                     Prefetch(
                         query=visual_vector,
                         using="visual",
+                        filter=query_filter,
                         limit=limit*2,
                     ),
                     Prefetch(
                         query=text_dense_vector.tolist(),
                         using="text_dense",
+                        filter=query_filter,
                         limit=limit*2,
                     ),
                     Prefetch(
@@ -223,6 +652,7 @@ class QdrantManager:
                             values=text_sparse_vector.values.tolist(),
                         ),
                         using="text_sparse",
+                        filter=query_filter,
                         limit=limit*2,
                     ),
                 ],
@@ -232,16 +662,21 @@ class QdrantManager:
             
 
             for elem in search_result.dict()['points']:
-                results.append({'id':elem['id'],
-                            'score':elem['score'],
-                            'video_name':elem['payload']['video_name'],
-                            'video_path':elem['payload']['video_path'],
-                            'transcript':elem['payload']['transcript'],
-                            'query':query_text,
-                            'preview_path':elem['payload']['preview_path']})
+                results.append(self._search_result(elem['id'], elem['score'], elem['payload'], query_text))
                 
             return results
         
         except Exception as e:
             print(f"Ошибка при выполнении гибридного поиска: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+    def _search_result(self, point_id, score: float, payload: Dict[str, Any], query_text: str) -> Dict[str, Any]:
+        '''результат поиска в формате API из точки коллекции'''
+        return {'id': str(point_id),
+                'score': score,
+                'video_name': payload['video_name'],
+                'video_path': payload['video_path'],
+                'transcript': payload['transcript'],
+                'query': query_text,
+                'preview_path': payload['preview_path'],
+                'sprite_path': payload.get('sprite_path')}
\ No newline at end of file
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+import config
+from .qdrant_client import QdrantManager
+
+# версия формата архива: меняется при несовместимых изменениях состава или манифеста
+SNAPSHOT_FORMAT_VERSION = 1
+SEMANTIC_CACHE_COLLECTION = "semantic_cache_queries"
+VIDEO_SNAPSHOT_FILE = "video_search.snapshot"
+SEMANTIC_CACHE_SNAPSHOT_FILE = "semantic_cache_queries.snapshot"
+
+
+def _qdrant_url() -> str:
+    return f"http://{config.QDRANT_HOST}:{config.QDRANT_PORT}"
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _check_backend(db_manager: QdrantManager) -> None:
+    '''снапшоты создает и восстанавливает только сервер Qdrant'''
+    if getattr(db_manager, "mode", None) != "remote":
+        raise RuntimeError(f"Снапшоты доступны только для сервера Qdrant (QDRANT_MODE=remote), "
+                           f"текущий режим: {getattr(db_manager, 'mode', None)}")
+
+
+def _index_settings() -> Dict[str, Any]:
+    '''настройки, с которыми совместим индекс: при других моделях векторы запросов не совпадут с индексом'''
+    return {
+        "visual_model": config.VISUAL_MODEL,
+        "text_model": config.TEXT_MODEL,
+        "text_sparse_model": config.TEXT_SPARSE_MODEL,
+        "visual_vector_size": config.VISUAL_VECTOR_SIZE,
+        "text_vector_size": config.TEXT_VECTOR_SIZE,
+    }
+
+
+def _download_snapshot(db_manager: QdrantManager, collection_name: str, target_path: str) -> None:
+    '''создание снапшота коллекции на сервере, скачивание и удаление с сервера'''
+    snapshot = db_manager.client.create_snapshot(collection_name=collection_name, wait=True)
+    try:
+        url = f"{_qdrant_url()}/collections/{collection_name}/snapshots/{snapshot.name}"
+        with httpx.stream("GET", url, timeout=config.QDRANT_TIMEOUT) as response:
+            response.raise_for_status()
+            with open(target_path, 'wb') as f:
+                for chunk in response.iter_bytes(chunk_size=1024 * 1024):
+                    f.write(chunk)
+    finally:
+        db_manager.client.delete_snapshot(collection_name=collection_name, snapshot_name=snapshot.name)
+
+
+def _upload_snapshot(collection_name: str, snapshot_path: str) -> None:
+    '''восстановление коллекции из файла снапшота (коллекция создается или перезаписывается)'''
+    with open(snapshot_path, 'rb') as f:
+        # восстановление большого снапшота может идти минуты, поэтому без таймаута на чтение ответа
+        response = httpx.post(
+            f"{_qdrant_url()}/collections/{collection_name}/snapshots/upload",
+            params={"priority": "snapshot", "wait": "true"},
+            files={"snapshot": (os.path.basename(snapshot_path), f)},
+            timeout=httpx.Timeout(config.QDRANT_TIMEOUT, read=None),
+        )
+    response.raise_for_status()
+
+
+def export_snapshot(db_manager: QdrantManager, output_path: Optional[str] = None) -> str:
+    '''
+    выгрузка индекса в один архив: снапшоты коллекций видео и семантического кэша
+    и манифест (версия формата, настройки моделей, список проиндексированных видео, sha256 файлов);
+    рядом пишется <архив>.sha256 с контрольной суммой всего архива
+    параметры:
+        db_manager: менеджер сервера Qdrant
+        output_path: путь к архиву (по умолчанию config.SNAPSHOTS_DIR/index_<дата>.tar)
+    вывод: путь к архиву
+    '''
+    _check_backend(db_manager)
+    output_path = output_path or os.path.join(config.SNAPSHOTS_DIR, f"index_{time.strftime('%Y%m%d_%H%M%S')}.tar")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    started = time.perf_counter()
+    video_collection = db_manager._alias_target() or config.QDRANT_COLLECTION
+    work_dir = tempfile.mkdtemp(prefix="snapshot_", dir=config.TEMP_DIR if os.path.isdir(config.TEMP_DIR) else None)
+    try:
+        files = {
+            VIDEO_SNAPSHOT_FILE: video_collection,
+            SEMANTIC_CACHE_SNAPSHOT_FILE: SEMANTIC_CACHE_COLLECTION,
+        }
+        for file_name, collection_name in files.items():
+            print(f"Снапшот коллекции '{collection_name}'...")
+            _download_snapshot(db_manager, collection_name, os.path.join(work_dir, file_name))
+
+        indexed_videos = sorted(db_manager.get_indexed_video_paths())
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "created_at": int(time.time()),
+            "source_collection": video_collection,
+            "settings": _index_settings(),
+            "videos": indexed_videos,
+            "files": {file_name: _sha256(os.path.join(work_dir, file_name)) for file_name in files},
+        }
+        with open(os.path.join(work_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        temp_path = f"{output_path}.tmp"
+        with tarfile.open(temp_path, "w") as archive:
+            archive.add(os.path.join(work_dir, "manifest.json"), arcname="manifest.json")
+            for file_name in files:
+                archive.add(os.path.join(work_dir, file_name), arcname=file_name)
+        os.replace(temp_path, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    archive_hash = _sha256(output_path)
+    with open(f"{output_path}.sha256", 'w') as f:
+        f.write(f"{archive_hash}  {os.path.basename(output_path)}\n")
+
+    print(f"Индекс ({len(indexed_videos)} видео) выгружен в {output_path} за {time.perf_counter() - started:.1f} с")
+    return output_path
+
+
+def import_snapshot(db_manager: QdrantManager, archive_path: str, videos_dir: Optional[str] = None) -> Dict[str, Any]:
+    '''
+    восстановление индекса из архива export_snapshot: проверка контрольных сумм и настроек моделей,
+    коллекция видео восстанавливается в новую версию и подключается переключением алиаса,
+    семантический кэш перезаписывается
+    параметры:
+        db_manager: менеджер сервера Qdrant
+        archive_path: путь к архиву
+        videos_dir: директория с видео, чтобы сообщить, каких файлов из манифеста не хватает
+    вывод: манифест архива
+    '''
+    _check_backend(db_manager)
+    started = time.perf_counter()
+
+    checksum_path = f"{archive_path}.sha256"
+    if os.path.exists(checksum_path):
+        with open(checksum_path) as f:
+            expected = f.read().split()[0]
+        if _sha256(archive_path) != expected:
+            raise RuntimeError(f"Контрольная сумма архива {archive_path} не совпадает с {checksum_path}")
+
+    work_dir = tempfile.mkdtemp(prefix="snapshot_", dir=config.TEMP_DIR if os.path.isdir(config.TEMP_DIR) else None)
+    try:
+        with tarfile.open(archive_path, "r") as archive:
+            with archive.extractfile("manifest.json") as f:
+                manifest = json.load(f)
+            if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+                raise RuntimeError(f"Неподдерживаемая версия архива: {manifest.get('format_version')} "
+                                   f"(ожидается {SNAPSHOT_FORMAT_VERSION})")
+            if manifest.get("settings") != _index_settings():
+                raise RuntimeError(f"Архив собран с другими моделями: {manifest.get('settings')}, "
+                                   f"текущие: {_index_settings()}")
+            # извлекаются только известные файлы: имена из манифеста в пути не подставляются
+            for file_name in (VIDEO_SNAPSHOT_FILE, SEMANTIC_CACHE_SNAPSHOT_FILE):
+                archive.extract(file_name, work_dir)
+                if _sha256(os.path.join(work_dir, file_name)) != manifest["files"].get(file_name):
+                    raise RuntimeError(f"Контрольная сумма {file_name} не совпадает с манифестом")
+
+        version_name = db_manager._new_version_name()
+        print(f"Восстановление коллекции видео в '{version_name}'...")
+        _upload_snapshot(version_name, os.path.join(work_dir, VIDEO_SNAPSHOT_FILE))
+        db_manager.activate_version(version_name)
+        print(f"Восстановление коллекции '{SEMANTIC_CACHE_COLLECTION}'...")
+        _upload_snapshot(SEMANTIC_CACHE_COLLECTION, os.path.join(work_dir, SEMANTIC_CACHE_SNAPSHOT_FILE))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Индекс ({len(manifest['videos'])} видео) восстановлен за {time.perf_counter() - started:.1f} с")
+    if videos_dir:
+        local_videos = {
+            db_manager.normalize_video_path(os.path.join(videos_dir, name)) for name in os.listdir(videos_dir)
+        } if os.path.isdir(videos_dir) else set()
+        missing = [path for path in manifest['videos'] if path not in local_videos]
+        if missing:
+            print(f"ВНИМАНИЕ: в {videos_dir} нет {len(missing)} видео из индекса (поиск найдет их, но не покажет), "
+                  f"например: {missing[:5]}")
+    return manifest
@@ -1,19 +1,140 @@
 import os
 import re
+import json
+import hashlib
 import subprocess
 import tempfile
 import shutil
+import time
 import cv2
 import numpy as np
-from typing import List, Tuple
-from faster_whisper import WhisperModel
+from typing import List, Tuple, Dict, Any, Optional
 from moviepy.editor import VideoFileClip
 from pathlib import Path
 import config
-import torch
+from models import get_registry
 import uuid
 import soundfile as sf
-from PIL import Image
+from PIL import Image, features
+
+class FrameSelector:
+    '''
+    потоковый отбор кадров для CLIP: в режиме "scene" кадр берется на смене сцены
+    (разница гистограмм или пикселей на уменьшенных кадрах), в обоих режимах
+    отбрасываются кадры, чей dHash совпадает с последним взятым кадром;
+    в режиме "interval" берутся первые max_frames кадров, в режиме "scene" смены сцен
+    копятся по всему видео (уменьшенными до config.SCENE_FRAME_WIDTH), а max_frames из них
+    равномерно выбирает selected_frames
+    '''
+
+    def __init__(self, mode: str, max_frames: int):
+        self.mode = mode
+        self.max_frames = max_frames
+        self.frames = []
+        self.timestamps = []
+        self._prev_small = None
+        self._prev_hist = None
+        self._last_kept_hash = None
+        self._last_kept_time = None
+        # буфер смен сцен: сохраняется каждая _stride-я смена, последняя - всегда (в _tail)
+        self._stride = 1
+        self._changes = 0
+        self._tail = None
+
+    @property
+    def full(self) -> bool:
+        return self.mode != "scene" and len(self.timestamps) >= self.max_frames
+
+    def offer(self, frame: np.ndarray, timestamp: float) -> bool:
+        '''
+        предложить кадр
+        параметры:
+            frame: кадр в RGB (любого размера, сравнение идет на уменьшенной копии)
+            timestamp: время кадра в секундах
+        вывод: True, если кадр взят
+        '''
+        if self.full:
+            return False
+
+        if frame.shape[1::-1] == tuple(config.SCENE_DOWNSCALE_SIZE):
+            small = frame
+        else:
+            small = cv2.resize(frame, config.SCENE_DOWNSCALE_SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+        if self.mode == "scene" and not self._is_scene_change(small, gray, timestamp):
+            return False
+
+        # отсев почти одинаковых кадров по dHash уменьшенного кадра
+        tiny = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        frame_hash = int.from_bytes(np.packbits((tiny[:, 1:] > tiny[:, :-1]).flatten()).tobytes(), 'big')
+        if self._last_kept_hash is not None and bin(frame_hash ^ self._last_kept_hash).count('1') <= config.FRAME_DEDUP_DISTANCE:
+            return False
+
+        self._last_kept_hash = frame_hash
+        self._last_kept_time = timestamp
+        if self.mode == "scene":
+            self._buffer_scene(frame, timestamp)
+        else:
+            self.timestamps.append(timestamp)
+            self.frames.append(frame)
+        return True
+
+    def _buffer_scene(self, frame: np.ndarray, timestamp: float) -> None:
+        '''
+        смена сцены в буфер не больше 2 * max_frames кадров: при переполнении остается каждый второй,
+        и дальше сохраняется каждая 2-я, 4-я... смена - буфер равномерно покрывает все видео
+        при постоянной памяти, а последняя смена хранится отдельно, чтобы конец видео не выпал
+        '''
+        height, width = frame.shape[:2]
+        if width > config.SCENE_FRAME_WIDTH:
+            size = (config.SCENE_FRAME_WIDTH, max(1, round(height * config.SCENE_FRAME_WIDTH / width)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        self._changes += 1
+        if (self._changes - 1) % self._stride:
+            self._tail = (timestamp, frame)
+            return
+        self._tail = None
+        self.timestamps.append(timestamp)
+        self.frames.append(frame)
+        if len(self.frames) >= 2 * self.max_frames:
+            # последний кадр буфера при прореживании выпадает, он остается последней сменой
+            self._tail = (self.timestamps[-1], self.frames[-1])
+            self.timestamps = self.timestamps[::2]
+            self.frames = self.frames[::2]
+            self._stride *= 2
+
+    def selected_frames(self) -> List[np.ndarray]:
+        '''кадры для CLIP: в режиме "scene" не больше max_frames смен сцен равномерно по всему видео (первая и последняя входят всегда)'''
+        frames = list(self.frames)
+        if self._tail is not None:
+            frames.append(self._tail[1])
+        count = len(frames)
+        if self.mode != "scene" or count <= self.max_frames:
+            return frames
+        if self.max_frames == 1:
+            return frames[:1]
+        step = (count - 1) / (self.max_frames - 1)
+        return [frames[round(i * step)] for i in range(self.max_frames)]
+
+    def _is_scene_change(self, small: np.ndarray, gray: np.ndarray, timestamp: float) -> bool:
+        '''смена сцены относительно предыдущего просмотренного кадра (или слишком долго без кадров)'''
+        hsv = cv2.cvtColor(small, cv2.COLOR_RGB2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+        cv2.normalize(hist, hist)
+
+        prev_hist, prev_small = self._prev_hist, self._prev_small
+        self._prev_hist, self._prev_small = hist, gray
+
+        if prev_hist is None or self._last_kept_time is None:
+            return True
+        if timestamp - self._last_kept_time >= config.SCENE_MAX_GAP:
+            return True
+
+        hist_distance = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+        pixel_difference = float(np.mean(cv2.absdiff(prev_small, gray))) / 255.0
+        return hist_distance >= config.SCENE_HIST_THRESHOLD or pixel_difference >= config.SCENE_PIXEL_THRESHOLD
+
 
 class VideoProcessor:
     '''класс для обработки видеофайлов'''
@@ -22,121 +143,318 @@ class VideoProcessor:
         '''инициализация процессора видео'''
         self.frame_interval = config.FRAME_EXTRACTION_INTERVAL
         self.max_frames = config.MAX_FRAMES_PER_VIDEO
-        self.audio_model = WhisperModel(config.TRANSCRIBE_MODEL, device="cuda" if torch.cuda.is_available() else "cpu")
+        self.frame_selection_mode = config.FRAME_SELECTION_MODE
+        # whisper из общего реестра моделей: загружается при первой транскрипции
+        self.models = get_registry()
+
+    @property
+    def audio_model(self):
+        return self.models.get("whisper")
     
     def get_video_files(self, directory: str) -> List[str]:
-        '''получение списка всех видеофайлов в директории'''
+        '''получение списка всех видеофайлов в директории (скрытые - недописанные .tmp_* и т.п. - пропускаются)'''
         video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
         video_files = []
         
         for file in os.listdir(directory):
+            if file.startswith('.'):
+                continue
             if any(file.lower().endswith(ext) for ext in video_extensions):
                 video_files.append(os.path.join(directory, file))
                 
         return video_files
+
+    def cleanup_stale_temp_videos(self, directory: str, max_age: Optional[float] = None) -> List[str]:
+        '''
+        удаление веб-копий .tmp_*.mp4, брошенных ffmpeg, который убили посреди конвертации
+        параметры:
+            directory: директория веб-совместимых видео
+            max_age: удаляются файлы, не менявшиеся дольше (сек.; по умолчанию config.JOBS_LEASE_TIMEOUT),
+                чтобы не задеть копию, которую сейчас пишет параллельное задание
+        вывод: удаленные пути
+        '''
+        max_age = config.JOBS_LEASE_TIMEOUT if max_age is None else max_age
+        removed = []
+        if not os.path.isdir(directory):
+            return removed
+        now = time.time()
+        for file in os.listdir(directory):
+            path = os.path.join(directory, file)
+            if not (file.startswith('.tmp_') and file.endswith('.mp4')):
+                continue
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed.append(path)
+            except OSError:
+                continue
+        if removed:
+            print(f"Удалено недописанных веб-копий: {len(removed)}")
+        return removed
     
-    def convert_videos_to_web_compatible(self, source_dir, target_dir):
-        """
-        Конвертирует все видео из исходной директории в веб-совместимый формат
-        с использованием кодека H.264 и сохраняет их в целевую директорию 
-        с сохранением оригинальных имен файлов.
-        После успешной конвертации удаляет исходные файлы.
-        
-        Параметры:
-            source_dir: Директория с исходными видеофайлами
-            target_dir: Директория для сохранения конвертированных видеофайлов
-        """
-        
+    def plan_web_conversion(self, source_dir: str, target_dir: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+        '''
+        план конвертации: какие исходные видео куда будут сконвертированы
+        параметры:
+            source_dir: директория с исходными видеофайлами (обходится рекурсивно)
+            target_dir: директория для веб-совместимых видео
+        вывод: список пар (исходный путь, целевой путь) и список пропущенных (цель уже существует)
+        '''
         if not os.path.exists(target_dir):
             os.makedirs(target_dir, exist_ok=True)
-        
+
         video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
-        video_paths = []
-        
-        for root, _, files in os.walk(source_dir):
-            for file in files:
-                if any(file.lower().endswith(ext) for ext in video_extensions):
-                    video_paths.append(os.path.join(root, file))
-        
-        # Списки для отслеживания успешно сконвертированных и пропущенных файлов
-        successfully_converted = []
+        to_convert = []
         skipped_files = []
-        failed_files = []
-        
-        # Конвертируем каждое видео
-        for i, source_path in enumerate(video_paths, 1):
-            try:
+        planned_targets = set()
+
+        for root, dirs, files in os.walk(source_dir):
+            # скрытые директории (.uploads с недокачанными загрузками) и файлы не конвертируются
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for file in files:
+                if file.startswith('.') or not any(file.lower().endswith(ext) for ext in video_extensions):
+                    continue
 
-                base_name = os.path.basename(source_path)
-                file_name_without_ext = os.path.splitext(base_name)[0]
+                source_path = os.path.join(root, file)
+                file_name_without_ext = os.path.splitext(file)[0]
                 safe_name = re.sub(r'[^\w\-_.]', '_', file_name_without_ext)
                 target_path = os.path.join(target_dir, f"{safe_name}.mp4")
-                
-                if os.path.exists(target_path):
+
+                if os.path.exists(target_path) or target_path in planned_targets:
                     skipped_files.append(source_path)
                     continue
-                
-                # Создаем временную директорию для промежуточного файла
-                temp_dir = tempfile.mkdtemp()
-                temp_output_path = os.path.join(temp_dir, f"temp_{safe_name}.mp4")
-                
-                try:
-                    command = [
-                        'ffmpeg', 
-                        '-i', source_path,
-                        '-vcodec', 'libx264',
-                        '-acodec', 'aac',
-                        '-strict', 'experimental',
-                        '-pix_fmt', 'yuv420p',
-                        '-profile:v', 'baseline',
-                        '-level', '3.0',
-                        '-movflags', '+faststart',
-                        '-y',
-                        temp_output_path
-                    ]
-                    
-                    process = subprocess.run(
-                        command,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE
-                    )
-                    
-                    if process.returncode == 0:
-                        shutil.copy2(temp_output_path, target_path)
-                        successfully_converted.append(source_path)
-                    else:
-                        error_message = process.stderr.decode()
-                        print(f"  - Ошибка конвертации видео: {error_message}")
-                        failed_files.append(source_path)
-                finally:
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    
-            except Exception as e:
-                print(f"Ошибка при конвертации видео {source_path}: {str(e)}")
-                failed_files.append(source_path)
-        
-        if successfully_converted:
-            for source_path in successfully_converted:
-                os.remove(source_path)
-
-        print("\nИтоги конвертации видео:")
-        print(f"  - Успешно сконвертировано и перемещено: {len(successfully_converted)}")
-        print(f"  - Пропущено (уже существуют): {len(skipped_files)}")
-        print(f"  - Не удалось сконвертировать: {len(failed_files)}")
+
+                planned_targets.add(target_path)
+                to_convert.append((source_path, target_path))
+
+        return to_convert, skipped_files
+
+    def is_web_compatible(self, info: Dict[str, Any]) -> bool:
+        '''можно ли отдавать видео в браузер без перекодирования (H.264 yuv420p + AAC или без звука)'''
+        return (
+            info.get('video_codec') == 'h264'
+            and info.get('pix_fmt') == 'yuv420p'
+            and info.get('audio_codec') in ('aac', None)
+        )
+
+    def _web_output_args(self, info: Optional[Dict[str, Any]] = None) -> List[str]:
+        '''
+        параметры ffmpeg для веб-совместимого выхода (H.264 + AAC в MP4)
+        параметры:
+            info: результат probe_video; если видео уже совместимо - потоки копируются без перекодирования
+        '''
+        stream_args = ['-map', '0:v:0', '-map', '0:a:0?']
+        if info is not None and self.is_web_compatible(info):
+            return stream_args + ['-c', 'copy', '-movflags', '+faststart']
+
+        return stream_args + [
+            '-vcodec', 'libx264',
+            '-preset', config.FFMPEG_PRESET,
+            '-crf', str(config.FFMPEG_CRF),
+            '-acodec', 'aac',
+            '-strict', 'experimental',
+            '-pix_fmt', 'yuv420p',
+            '-profile:v', 'baseline',
+            '-level', '3.0',
+            '-movflags', '+faststart',
+        ]
+
+    def probe_video(self, video_path: str) -> Dict[str, Any]:
+        '''
+        чтение параметров видео через ffprobe (только заголовки, без декодирования)
+        параметры:
+            video_path: путь к видео
+        вывод: словарь с размерами кадра (с учетом поворота), fps, длительностью и кодеками
+        '''
+        command = [
+            'ffprobe',
+            '-v', 'error',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            video_path
+        ]
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            raise RuntimeError(f"ffprobe не смог прочитать {video_path}: {process.stderr.decode(errors='ignore')}")
+
+        probe = json.loads(process.stdout)
+        streams = probe.get('streams', [])
+        video_stream = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio_stream = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        if video_stream is None:
+            raise RuntimeError(f"В файле {video_path} нет видеопотока")
+
+        # ffmpeg при декодировании применяет поворот, поэтому меняем стороны местами
+        rotation = video_stream.get('tags', {}).get('rotate', 0)
+        for side_data in video_stream.get('side_data_list', []):
+            rotation = side_data.get('rotation', rotation)
+        width, height = int(video_stream['width']), int(video_stream['height'])
+        if abs(int(float(rotation))) % 180 == 90:
+            width, height = height, width
+
+        num, _, den = video_stream.get('avg_frame_rate', '0/1').partition('/')
+        fps = float(num) / float(den) if den and float(den) else 0.0
+
+        fmt = probe.get('format', {})
+        duration = float(fmt.get('duration') or video_stream.get('duration') or 0.0)
+
+        return {
+            "width": width,
+            "height": height,
+            "fps": fps,
+            "duration": duration,
+            "format_name": fmt.get('format_name', ''),
+            "video_codec": video_stream.get('codec_name'),
+            "pix_fmt": video_stream.get('pix_fmt'),
+            "audio_codec": audio_stream.get('codec_name') if audio_stream else None,
+            "has_audio": audio_stream is not None,
+        }
+
+    def decode_video(self, video_path: str, web_output_path: Optional[str] = None,
+                     threads: int = 0, info: Optional[Dict[str, Any]] = None) -> Tuple[List[np.ndarray], str]:
+        '''
+        единое декодирование видео одним процессом ffmpeg: за один проход получаем
+        кадры (RGB, отобранные FrameSelector), 16 кГц моно WAV для транскрипции
+        и, при необходимости, веб-совместимую копию видео
+        параметры:
+            video_path: путь к видео
+            web_output_path: куда сохранить веб-совместимую копию (None - не сохранять)
+            threads: количество потоков кодирования веб-копии (0 - на усмотрение ffmpeg)
+            info: уже полученный результат probe_video (None - ffprobe запускается здесь)
+        вывод: список кадров и путь к временному WAV (в temp; без аудиодорожки - 1 с тишины)
+        '''
+        info = info or self.probe_video(video_path)
+        width, height = info['width'], info['height']
+        scene_mode = self.frame_selection_mode == "scene"
+
+        temp_audio_path = self._new_temp_audio_path()
+        temp_web_path = None
+
+        command = ['ffmpeg', '-v', 'error', '-nostdin', '-i', video_path]
+
+        if web_output_path:
+            # пишем рядом с целевым файлом и переименовываем только после успеха
+            target_dir = os.path.dirname(os.path.abspath(web_output_path))
+            os.makedirs(target_dir, exist_ok=True)
+            temp_web_path = os.path.join(target_dir, f".tmp_{uuid.uuid4().hex}.mp4")
+            command += self._web_output_args(info) + ['-threads', str(threads), '-y', temp_web_path]
+
+        # кадры - сырой RGB в stdout; в режиме интервала ffmpeg отдает кадры в полном размере
+        # и сам останавливается после max_frames, для поиска смен сцен - чаще и сразу уменьшенными
+        # до config.SCENE_FRAME_WIDTH (CLIP и превью больше не используют), кадры смен сцен
+        # берутся из этого же потока - повторного декодирования нет
+        selector = FrameSelector(self.frame_selection_mode, self.max_frames)
+        if scene_mode:
+            sample_rate = config.SCENE_SAMPLE_FPS
+            pipe_width = min(width, config.SCENE_FRAME_WIDTH)
+            # rgb24 с libswscale: четные стороны
+            pipe_width -= pipe_width % 2
+            pipe_height = max(2, round(height * pipe_width / width / 2) * 2)
+            frame_limit = []
+        else:
+            sample_rate = 1 / self.frame_interval
+            pipe_width, pipe_height = width, height
+            frame_limit = ['-frames:v', str(self.max_frames)]
+        frame_size = pipe_width * pipe_height * 3
+        command += [
+            '-map', '0:v:0',
+            '-vf', f'fps={sample_rate},scale={pipe_width}:{pipe_height}:flags=area',
+        ] + frame_limit + [
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            'pipe:1'
+        ]
+
+        # аудио - PCM 16 кГц моно, именно в таком виде его ждет whisper
+        if info['has_audio']:
+            command += [
+                '-map', '0:a:0',
+                '-ac', '1',
+                '-ar', str(config.AUDIO_SAMPLE_RATE),
+                '-c:a', 'pcm_s16le',
+                '-y', temp_audio_path
+            ]
+
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file)
+            try:
+                frame_index = 0
+                while True:
+                    # читаем поток до конца даже после набора кадров, иначе ffmpeg встанет на записи
+                    buffer = process.stdout.read(frame_size)
+                    if len(buffer) < frame_size:
+                        break
+                    if not selector.full:
+                        frame = np.frombuffer(buffer, dtype=np.uint8).reshape(pipe_height, pipe_width, 3)
+                        selector.offer(frame, frame_index / sample_rate)
+                    frame_index += 1
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+
+            if returncode != 0:
+                stderr_file.seek(0)
+                error_message = stderr_file.read().decode(errors='ignore')
+                self.cleanup_temp_file(temp_audio_path)
+                if temp_web_path:
+                    self.cleanup_temp_file(temp_web_path)
+                raise RuntimeError(f"Ошибка декодирования {video_path}: {error_message}")
+
+        if temp_web_path:
+            os.replace(temp_web_path, web_output_path)
+
+        if not os.path.exists(temp_audio_path):
+            dummy_audio = np.zeros(config.AUDIO_SAMPLE_RATE, dtype=np.float32)
+            sf.write(temp_audio_path, dummy_audio, config.AUDIO_SAMPLE_RATE)
+
+        return selector.selected_frames(), temp_audio_path
+
+    def compute_fingerprint(self, frames: List[np.ndarray]) -> List[str]:
+        '''
+        перцептивный отпечаток видео: dHash (64 бита) каждого извлеченного кадра
+        параметры:
+            frames: кадры в RGB
+        вывод: список хэшей кадров в hex
+        '''
+        fingerprint = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+            small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+            bits = small[:, 1:] > small[:, :-1]
+            fingerprint.append(np.packbits(bits.flatten()).tobytes().hex())
+        return fingerprint
+
+    def get_audio_duration(self, audio_path: str) -> float:
+        '''длительность аудио в секундах (читается только заголовок WAV)'''
+        try:
+            return float(sf.info(audio_path).duration)
+        except Exception as e:
+            print(f"Ошибка при чтении длительности аудио {audio_path}: {str(e)}")
+            return 0.0
+
+    def _new_temp_audio_path(self) -> str:
+        '''путь для нового временного WAV в temp'''
+        temp_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp")
+        os.makedirs(temp_dir, exist_ok=True)
+        return os.path.join(temp_dir, f"audio_{uuid.uuid4().hex}.wav")
   
     def extract_frames(self, video_path: str) -> List[np.ndarray]:
-        '''извлечение ключевых кадров из видео с заданным интервалом'''
-        frames = []
+        '''извлечение ключевых кадров из видео с заданным интервалом (или по сменам сцен)'''
+        selector = FrameSelector(self.frame_selection_mode, self.max_frames)
         vidcap = cv2.VideoCapture(video_path)
         
         # тут считаем интервал фреймов
         fps = vidcap.get(cv2.CAP_PROP_FPS)
-        frame_interval_count = int(fps * self.frame_interval)
+        if self.frame_selection_mode == "scene":
+            frame_interval_count = max(1, int(fps / config.SCENE_SAMPLE_FPS))
+        else:
+            frame_interval_count = max(1, int(fps * self.frame_interval))
         
         frame_count = 0
         success = True
         
-        while success and len(frames) < self.max_frames:
+        while success and not selector.full:
             success, image = vidcap.read()
             
             if not success:
@@ -145,20 +463,17 @@ class VideoProcessor:
             if frame_count % frame_interval_count == 0:
                 # Преобразование из BGR в RGB
                 image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                frames.append(image_rgb)
+                selector.offer(image_rgb, frame_count / fps if fps else 0.0)
                 
             frame_count += 1
             
         vidcap.release()
-        return frames
+        return selector.selected_frames()
     
     def extract_audio(self, video_path: str) -> str:
         '''извлечение аудио из видео, сохраняем во временный WAV (в temp)'''
         
-        temp_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        temp_audio_path = os.path.join(temp_dir, f"audio_{uuid.uuid4().hex}.wav")
+        temp_audio_path = self._new_temp_audio_path()
         
         try:
             video = VideoFileClip(video_path)
@@ -183,19 +498,54 @@ class VideoProcessor:
     
     def transcribe_audio(self, audio_path: str) -> str:
         '''транскрипция аудио в текст с использованием faster-whisper'''
+        return self.transcribe_audio_with_language(audio_path)[0]
+
+    def transcribe_audio_with_language(self, audio_path: str) -> Tuple[str, Optional[str]]:
+        '''
+        транскрипция аудио и язык речи, определенный whisper
+        вывод: текст и код языка ("ru", "en", ...; None - нет аудио или ошибка)
+        '''
         try:
             if not os.path.exists(audio_path):
                 print(f"Предупреждение: аудиофайл {audio_path} не существует")
-                return ""
+                return "", None
             
-            segments, info = self.audio_model.transcribe(audio_path, beam_size=5)
-            transcript = " ".join([segment.text for segment in segments])
+            with self.models.use("whisper") as audio_model:
+                segments, info = audio_model.transcribe(audio_path, beam_size=5)
+                # сегменты генерируются лениво, транскрипция идет при их чтении
+                transcript = " ".join([segment.text for segment in segments])
                 
-            return transcript
+            return transcript, info.language
         
         except Exception as e:
             print(f"Ошибка при транскрипции аудио {audio_path}: {str(e)}")
-            return ""
+            return "", None
+
+    def video_metadata(self, video_path: str, info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        '''
+        технические метаданные видео для payload и фильтров поиска
+        параметры:
+            video_path: путь к видео
+            info: уже полученный результат probe_video (None - ffprobe запускается здесь)
+        вывод: ширина, высота, fps, размер файла в байтах и время индексации (unix-время)
+        '''
+        metadata = {
+            "width": None,
+            "height": None,
+            "fps": None,
+            "file_size": os.path.getsize(video_path) if os.path.exists(video_path) else None,
+            "ingested_at": int(time.time()),
+        }
+        try:
+            info = info or self.probe_video(video_path)
+            metadata.update({
+                "width": info['width'],
+                "height": info['height'],
+                "fps": round(info['fps'], 3),
+            })
+        except Exception as e:
+            print(f"Ошибка при чтении параметров видео {video_path}: {str(e)}")
+        return metadata
             
     def cleanup_temp_file(self, file_path: str) -> None:
         '''в проыессе создаем временный файл, функция для очистки'''
@@ -205,68 +555,77 @@ class VideoProcessor:
         except Exception as e:
             print(f"Ошибка при удалении временного файла {file_path}: {str(e)}")
     
-    def save_preview_image(self, video_path: str) -> str:
+    def preview_paths(self, fingerprint: List[str]) -> Dict[str, Optional[str]]:
         '''
-        (отключена, но вдруг пригодится в будущих версиях) создаем превьюхи, чтобы видеть на фронте
+        URL превью и спрайта в /static; имя зависит от отпечатка кадров, поэтому при новом содержимом
+        меняется и адрес (файлы можно кэшировать без срока), а дубликаты делят одни файлы
         параметры:
-            video_path: путь к видео
-        вывод: путь к сохраненной превьюхе
+            fingerprint: dHash кадров (compute_fingerprint)
+        вывод: {"preview_path", "sprite_path"} (None, если кадров нет)
         '''
-        try:
-            # проверка директории
-            static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
-            previews_dir = os.path.join(static_dir, "previews")
-            
-            if not os.path.exists(static_dir):
-                os.makedirs(static_dir, exist_ok=True)
-                
-            if not os.path.exists(previews_dir):
-                os.makedirs(previews_dir, exist_ok=True)
-            
-            # имя превьюхи
-            video_basename = os.path.basename(video_path)
-            video_name_without_ext = os.path.splitext(video_basename)[0]
-            preview_path = os.path.join(previews_dir, f"{video_name_without_ext}.jpg")
+        if not fingerprint:
+            return {"preview_path": None, "sprite_path": None}
+        name = hashlib.sha1("".join(fingerprint).encode()).hexdigest()[:20]
+        extension = self._preview_format()[1]
+        return {
+            "preview_path": f"/static/previews/{name}.{extension}",
+            "sprite_path": f"/static/previews/{name}_sprite.{extension}",
+        }
 
-            if os.path.exists(preview_path):
-                return preview_path
+    def _preview_format(self) -> Tuple[str, str]:
+        '''формат Pillow и расширение файла; без поддержки WebP в сборке Pillow - JPEG'''
+        if config.PREVIEW_FORMAT == "webp" and features.check("webp"):
+            return "WEBP", "webp"
+        return "JPEG", "jpg"
 
-            vidcap = cv2.VideoCapture(video_path)
-            success, image = vidcap.read()
-            
-            if success:
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                pil_image = Image.fromarray(image_rgb)
-                pil_image.save(preview_path)
+    def save_preview_image(self, frames: List[np.ndarray], fingerprint: List[str]) -> Dict[str, Optional[str]]:
+        '''
+        превью (самый контрастный из отобранных кадров) и спрайт из кадров, уже декодированных
+        для CLIP, - видео повторно не открывается; готовые файлы не перезаписываются
+        параметры:
+            frames: кадры RGB (decode_video / extract_frames)
+            fingerprint: dHash кадров, из него строятся имена файлов
+        вывод: URL превью и спрайта (как preview_paths)
+        '''
+        paths = self.preview_paths(fingerprint)
+        if not frames or paths["preview_path"] is None:
+            return paths
 
-                preview_status = True
-                        
-            else:
-                # Если не удалось прочитать кадр, создаем пустое изображение
-                print(f"Не удалось получить кадр из видео {video_path}, создаем пустое изображение")
-                empty_image = np.zeros((360, 640, 3), dtype=np.uint8)
-                pil_image = Image.fromarray(empty_image)
-                pil_image.save(preview_path)
-                
-                preview_status = False
-
-                if preview_status:
-                    if os.path.exists(preview_path):
-                        pass
-                    else:
-                        print(f"ОШИБКА: Файл не был создан: {preview_path}")
-                else:
-                    if os.path.exists(preview_path):
-                        pass
-                    else:
-                        print(f"ОШИБКА: Пустое превью не было создано: {preview_path}")
-            
-            vidcap.release()
-            return preview_path
-            
+        try:
+            os.makedirs(config.PREVIEWS_DIR, exist_ok=True)
+            pil_format = self._preview_format()[0]
+            preview_file = os.path.join(config.PREVIEWS_DIR, os.path.basename(paths["preview_path"]))
+            sprite_file = os.path.join(config.PREVIEWS_DIR, os.path.basename(paths["sprite_path"]))
+
+            if not os.path.exists(preview_file):
+                # первый кадр часто черный, берем кадр с наибольшим разбросом яркости
+                best = max(frames, key=lambda frame: float(frame[::8, ::8].std()))
+                self._save_image(self._resize_to_width(Image.fromarray(best), config.PREVIEW_WIDTH),
+                                 preview_file, pil_format)
+
+            if not os.path.exists(sprite_file):
+                step = max(1, len(frames) / config.SPRITE_MAX_FRAMES)
+                tiles = [
+                    self._resize_to_width(Image.fromarray(frames[int(i * step)]), config.SPRITE_TILE_WIDTH)
+                    for i in range(min(len(frames), config.SPRITE_MAX_FRAMES))
+                ]
+                tile_width, tile_height = tiles[0].size
+                columns = min(config.SPRITE_COLUMNS, len(tiles))
+                rows = (len(tiles) + columns - 1) // columns
+                sprite = Image.new("RGB", (tile_width * columns, tile_height * rows))
+                for i, tile in enumerate(tiles):
+                    sprite.paste(tile.resize((tile_width, tile_height)), ((i % columns) * tile_width, (i // columns) * tile_height))
+                self._save_image(sprite, sprite_file, pil_format)
         except Exception as e:
-            print(f"ОШИБКА при создании превью для {video_path}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
-        
\ No newline at end of file
+            print(f"Ошибка при создании превью: {str(e)}")
+        return paths
+
+    def _resize_to_width(self, image: Image.Image, width: int) -> Image.Image:
+        height = max(1, round(image.height * width / image.width))
+        return image.resize((width, height), Image.BILINEAR)
+
+    def _save_image(self, image: Image.Image, path: str, pil_format: str) -> None:
+        '''запись через временный файл, чтобы API не отдал недописанное изображение'''
+        temp_path = f"{path}.tmp_{uuid.uuid4().hex}"
+        image.save(temp_path, format=pil_format, quality=config.PREVIEW_QUALITY)
+        os.replace(temp_path, path)